@@ -0,0 +1,70 @@
+"""
+PDF text extraction: pypdf vs PyMuPDF on a synthetic resume corpus.
+
+Writes --files PDFs of 1..--max-pages pages with PyMuPDF, then for each backend
+reports per-file latency parsing inline (one process, one file at a time) and
+throughput through pdf_extract's process pool with --threads concurrent callers,
+as the ingestion parse workers use it. Also reports how many characters each
+backend extracted, as a sanity check that both read the same text.
+
+    python bench_pdf_extract.py --files 200 --max-pages 8
+    python bench_pdf_extract.py --files 500 --threads 8 --backends pymupdf
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pdf_extract
+
+WORDS = ("python", "fastapi", "kubernetes", "led", "designed", "migrated", "latency", "pipeline",
+         "team", "customers", "postgres", "react", "reduced", "costs", "by", "built", "service", "the")
+
+def synthetic_pdf(pages, rng):
+    pymupdf = pdf_extract._pymupdf()
+    document = pymupdf.open()
+    for number in range(pages):
+        page = document.new_page()
+        lines = [f"Jane Doe - Resume - page {number + 1}"]
+        lines += [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(45)]
+        page.insert_text((40, 40), "\n".join(lines), fontsize=9)
+    content = document.tobytes()
+    document.close()
+    return content
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--max-pages", type=int, default=6)
+    parser.add_argument("--threads", type=int, default=pdf_extract.PDF_WORKERS)
+    parser.add_argument("--backends", default=",".join(pdf_extract.BACKENDS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = [synthetic_pdf(rng.randint(1, args.max_pages), rng) for _ in range(args.files)]
+    total_mb = sum(len(content) for content in corpus) / 1e6
+    print(f"{args.files} PDFs, 1-{args.max_pages} pages, {total_mb:.1f} MB; pool of {pdf_extract.PDF_WORKERS} workers, {args.threads} callers")
+    print(f"{'backend':<10}{'inline p50 ms':>15}{'inline p95 ms':>15}{'inline files/s':>16}{'pool files/s':>14}{'chars':>12}")
+
+    for backend in args.backends.split(","):
+        latencies, chars = [], 0
+        for content in corpus:
+            started = time.perf_counter()
+            chars += len(pdf_extract.join_pages(pdf_extract.extract_pages_inline(content, backend)))
+            latencies.append(time.perf_counter() - started)
+
+        pdf_extract.extract_pages(corpus[0], backend) # Start the pool's workers outside the timing
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as callers:
+            list(callers.map(lambda content: pdf_extract.extract_pages(content, backend), corpus))
+        pooled = time.perf_counter() - started
+
+        print(f"{backend:<10}{percentile(latencies, 0.5) * 1000:>15.1f}{percentile(latencies, 0.95) * 1000:>15.1f}"
+              f"{len(corpus) / sum(latencies):>16.1f}{len(corpus) / pooled:>14.1f}{chars:>12}")
+
+if __name__ == "__main__":
+    main()
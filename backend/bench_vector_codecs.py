@@ -0,0 +1,85 @@
+"""
+Memory / recall trade-off of the vector codecs.
+
+For each codec, builds an index over the same synthetic corpus, writes it to
+disk, then reports bytes per vector, resident memory after a normal load vs a
+memory-mapped read-only load, and recall@k against exact float32 search.
+
+    python bench_vector_codecs.py --n 200000 --tier flat
+    python bench_vector_codecs.py --n 500000 --tier hnsw --codecs sq8,pq
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+import faiss
+import numpy as np
+import vector_index
+from bench_vector_index import synthetic_corpus, measure, recall_at_k
+
+def resident_mb():
+    # Linux only; good enough to show what a worker pays per loaded index
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        return float("nan")
+
+def _load_and_measure(path, mmap):
+    before = resident_mb()
+    index = vector_index.read_index(path, mmap=mmap)
+    return resident_mb() - before
+
+def load_cost(path, mmap):
+    # Fresh process per load, so freed memory from earlier codecs can't hide the cost
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(_load_and_measure, (path, mmap))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100000, help="corpus size")
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--tier", default="flat", choices=vector_index.TIERS)
+    parser.add_argument("--codecs", default=",".join(vector_index.CODECS))
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.n + args.queries, args.dimension, args.clusters)
+    vectors, queries = corpus[:args.n], corpus[args.n:]
+    ids = np.arange(args.n, dtype=np.int64)
+
+    # Ground truth is always exact float32 search, whatever tier is being measured
+    exact = vector_index.build_index("flat", args.dimension, ids, vectors)
+    ground_truth, _ = measure(exact, queries, args.k)
+    del exact
+
+    print(f"Corpus: {args.n} x {args.dimension}, tier={args.tier}, {args.queries} queries, k={args.k}")
+    print(f"{'codec':<6} {'B/vec':>7} {'file MB':>8} {'RSS MB':>8} {'mmap MB':>8} {'recall@k':>9} {'p50 ms':>8}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for codec in args.codecs.split(","):
+            path = os.path.join(tmp, f"{codec}.bin")
+            started = time.perf_counter()
+            index = vector_index.build_index(args.tier, args.dimension, ids, vectors, codec=codec)
+            build_seconds = time.perf_counter() - started
+            faiss.write_index(index, path)
+            del index
+
+            file_mb = os.path.getsize(path) / 1e6
+            rss_mb = load_cost(path, mmap=False)
+            mmap_mb = load_cost(path, mmap=True)
+            mapped = vector_index.read_index(path, mmap=True)
+
+            results, latencies = measure(mapped, queries, args.k)
+            del mapped
+            print(
+                f"{codec:<6} {file_mb * 1e6 / args.n:>7.0f} {file_mb:>8.1f} {rss_mb:>8.1f} {mmap_mb:>8.1f} "
+                f"{recall_at_k(results, ground_truth):>9.3f} {np.percentile(latencies, 50):>8.3f}"
+                f"   (built in {build_seconds:.1f}s)"
+            )
+
+if __name__ == "__main__":
+    main()
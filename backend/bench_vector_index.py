@@ -0,0 +1,68 @@
+"""
+Recall / latency benchmark for the vector index tiers.
+
+Builds every tier over the same synthetic corpus of normalized vectors and
+reports recall@k against the exact flat index, plus per-query latency.
+
+    python bench_vector_index.py --n 200000 --queries 1000 --k 10
+"""
+import argparse
+import time
+import numpy as np
+import vector_index
+
+def synthetic_corpus(n, dimension, clusters, seed=0):
+    # Resumes cluster by role/skills; uniform random vectors would flatter the ANN tiers
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    assignment = rng.integers(0, clusters, n)
+    vectors = centers[assignment] + 0.6 * rng.standard_normal((n, dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+def measure(index, queries, k):
+    latencies = []
+    results = np.empty((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        started = time.perf_counter()
+        _, I = index.search(query.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - started)
+        results[i] = I[0]
+    return results, np.array(latencies) * 1000
+
+def recall_at_k(results, ground_truth):
+    hits = sum(len(set(r) & set(g)) for r, g in zip(results, ground_truth))
+    return hits / ground_truth.size
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100000, help="corpus size")
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--tiers", default=",".join(vector_index.TIERS))
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.n + args.queries, args.dimension, args.clusters)
+    vectors, queries = corpus[:args.n], corpus[args.n:]
+    ids = np.arange(args.n, dtype=np.int64)
+
+    print(f"Corpus: {args.n} x {args.dimension}, {args.queries} queries, k={args.k}, nprobe={vector_index.VECTOR_IVF_NPROBE}")
+    print(f"{'tier':<6} {'build s':>8} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'qps':>8}")
+
+    ground_truth = None
+    for tier in ["flat"] + [t for t in args.tiers.split(",") if t != "flat"]:
+        started = time.perf_counter()
+        index = vector_index.build_index(tier, args.dimension, ids, vectors)
+        build_seconds = time.perf_counter() - started
+
+        results, latencies = measure(index, queries, args.k)
+        if ground_truth is None:
+            ground_truth = results
+        recall = recall_at_k(results, ground_truth)
+        qps = 1000 / latencies.mean()
+        print(f"{tier:<6} {build_seconds:>8.2f} {recall:>9.3f} {np.percentile(latencies, 50):>8.3f} {np.percentile(latencies, 95):>8.3f} {qps:>8.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Bulk resume import: loads a directory or .zip archive of PDFs as Candidates owned by
+a recruiter, without going through /upload-resume one file at a time.
+
+Each chunk of --chunk files is parsed in parallel across cores (pdf_extract's process
+pool), extracted with concurrent LLM calls routed as bulk work (answered from llm_cache
+when a resume was extracted before), embedded in batches of --embed-batch, inserted with
+one multi-row INSERT and added to the FAISS index in one upsert. The index is saved once,
+at the end.
+
+Stop the server first: the import writes the same vector index and log, which have a
+single writer process, and refuses to start while the server has them open.
+
+Resumable: files are recorded by their SHA-256 (Candidate.resume_sha256) and each chunk
+is committed as a whole, so running the same command again skips everything already
+imported. Files matching one of the owner's existing resumes (same file, or same text)
+are skipped too. Files that fail (unreadable PDF, LLM error) are listed and retried on
+the next run.
+
+    python bulk_import.py resumes/ --owner recruiter@example.com
+    python bulk_import.py archive.zip --owner recruiter@example.com --chunk 500 --concurrency 16
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import sys
+import time
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from sqlalchemy import insert, select
+from database import SessionLocal, engine, Base
+from models import Candidate, User
+import compaction
+import migrations
+import pdf_extract
+from vector_log import VectorLogLocked
+# ingestion, llm and rag are imported where they are used: pdf_extract's worker processes import
+# this script as their __main__ module, and must not load the embedding model or open the vector store
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def pdf_sources(path):
+    """
+    (filename, read) for every PDF under a directory or in a zip archive, in a stable order;
+    read() returns the file's bytes.
+    """
+    if zipfile.is_zipfile(path):
+        archive = zipfile.ZipFile(path)
+        for info in sorted(archive.infolist(), key=lambda info: info.filename):
+            if info.is_dir() or not info.filename.lower().endswith(".pdf") or info.filename.startswith("__MACOSX/"):
+                continue
+            yield os.path.basename(info.filename), (lambda info=info: archive.read(info))
+        return
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                full_path = os.path.join(root, name)
+                yield name, (lambda full_path=full_path: _read_file(full_path))
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+class Importer:
+    def __init__(self, owner, args):
+        self.owner = owner
+        self.args = args
+        self.timings = defaultdict(float) # stage -> seconds
+        self.counts = defaultdict(int) # imported, already imported, duplicate, failed
+        self.failures = []
+        # Fingerprints of the owner's resumes, including the ones imported by this run
+        db = SessionLocal()
+        try:
+            rows = db.query(Candidate.resume_sha256, Candidate.resume_text_hash).filter(Candidate.user_id == owner.id).all()
+        finally:
+            db.close()
+        self.file_hashes = {file_hash for file_hash, _ in rows if file_hash}
+        self.text_hashes = {text_hash for _, text_hash in rows if text_hash}
+        self.parsers = ThreadPoolExecutor(max(1, pdf_extract.PDF_WORKERS)) # Each thread waits on one pool process
+        # One event loop for the whole run: the LLM clients' connection pools belong to the loop they were first used on
+        self.loop = asyncio.new_event_loop()
+
+    @contextmanager
+    def timed(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] += time.perf_counter() - started
+
+    def _fail(self, filename, error):
+        self.counts["failed"] += 1
+        self.failures.append((filename, error))
+
+    def _parse(self, content):
+        import ingestion
+        pages, text = pdf_extract.extract_text(content)
+        compact_text, compact_tokens = compaction.compact_resume(pages)
+        return text, compact_text, compact_tokens, ingestion.text_fingerprint(text)
+
+    def import_chunk(self, sources):
+        import llm
+        import rag
+        # 1. Read and fingerprint; skip what an earlier run (or earlier in this run) already imported
+        with self.timed("read"):
+            files = []
+            for filename, read in sources:
+                try:
+                    content = read()
+                except OSError as e:
+                    self._fail(filename, str(e))
+                    continue
+                file_hash = hashlib.sha256(content).hexdigest()
+                if file_hash in self.file_hashes:
+                    self.counts["already imported"] += 1
+                    continue
+                self.file_hashes.add(file_hash)
+                files.append({"filename": filename, "content": content, "file_hash": file_hash})
+
+        # 2. Parse in parallel
+        with self.timed("parse"):
+            futures = [self.parsers.submit(self._parse, f["content"]) for f in files]
+            parsed = []
+            for f, future in zip(files, futures):
+                try:
+                    f["text"], f["compact_text"], f["compact_tokens"], f["text_hash"] = future.result()
+                except pdf_extract.PDFExtractionError as e:
+                    self.file_hashes.discard(f["file_hash"])
+                    self._fail(f["filename"], str(e))
+                    continue
+                f["content"] = None # Done with the bytes
+                if f["text_hash"] is None: # Too little text to compare (scanned PDF)
+                    parsed.append(f)
+                    continue
+                if f["text_hash"] in self.text_hashes:
+                    self.counts["duplicate"] += 1
+                    continue
+                self.text_hashes.add(f["text_hash"])
+                parsed.append(f)
+
+        # 3. Extract fields, --concurrency completions in flight, routed as bulk work (LLM_BULK_PROVIDER if set)
+        with self.timed("extract"):
+            with llm.use_workload("bulk"):
+                extracted = self.loop.run_until_complete(llm.extract_many_concurrently(
+                    [(f["text"], f["compact_text"]) for f in parsed], self.args.concurrency
+                ))
+            ready = []
+            for f, structured_data in zip(parsed, extracted):
+                if structured_data is None:
+                    # Not recorded anywhere, so the next run tries it again
+                    self.file_hashes.discard(f["file_hash"])
+                    self.text_hashes.discard(f["text_hash"])
+                    self._fail(f["filename"], "LLM extraction failed")
+                    continue
+                f["data"] = structured_data
+                ready.append(f)
+        if not ready:
+            return
+
+        # 4. Embed in large batches (one caller, so straight to the model rather than through the batcher)
+        with self.timed("embed"):
+            vectors = rag.model.encode([f["text"] for f in ready], batch_size=self.args.embed_batch, convert_to_numpy=True)
+
+        # 5. One multi-row INSERT for the chunk, then its vectors in one upsert, then commit.
+        # MySQL can't return the generated IDs of a multi-row INSERT, so they are read back by file
+        # hash, which is unique among the owner's resumes. A crash before the commit leaves at most
+        # vectors for rolled-back IDs, which the next upsert of that ID replaces.
+        db = SessionLocal()
+        try:
+            with self.timed("insert"):
+                rows = [{
+                    "name": f["data"].get("name", "Unknown"),
+                    "email": f["data"].get("email", "Unknown"),
+                    "phone": f["data"].get("phone", ""),
+                    "skills": f["data"].get("skills", ""),
+                    "total_experience": f["data"].get("total_experience", 0.0),
+                    "current_role": f["data"].get("current_role", ""),
+                    "companies": f["data"].get("companies", ""),
+                    "raw_text": f["text"],
+                    "compact_text": f["compact_text"],
+                    "compact_tokens": f["compact_tokens"],
+                    "resume_filename": f["filename"],
+                    "resume_sha256": f["file_hash"],
+                    "resume_text_hash": f["text_hash"],
+                    "user_id": self.owner.id,
+                } for f in ready]
+                db.execute(insert(Candidate).values(rows))
+                # Highest ID per hash: the row just inserted, should an older copy ever exist
+                ids_by_hash = dict(db.execute(
+                    select(Candidate.resume_sha256, Candidate.id)
+                    .where(Candidate.user_id == self.owner.id, Candidate.resume_sha256.in_([f["file_hash"] for f in ready]))
+                    .order_by(Candidate.id)
+                ).all())
+            with self.timed("index"):
+                rag.vector_store.upsert_vectors([ids_by_hash[f["file_hash"]] for f in ready], vectors)
+            with self.timed("insert"):
+                db.commit()
+        finally:
+            db.close()
+        self.counts["imported"] += len(ready)
+
+    def report(self, elapsed):
+        imported = self.counts["imported"]
+        print(f"\n{imported} imported, {self.counts['already imported']} already imported, "
+              f"{self.counts['duplicate']} duplicates, {self.counts['failed']} failed in {elapsed:.1f}s "
+              f"({imported / elapsed if elapsed else 0:.1f} resumes/s)")
+        for stage in ("read", "parse", "extract", "embed", "insert", "index", "save"):
+            seconds = self.timings[stage]
+            rate = f"{imported / seconds:.1f} resumes/s" if seconds and imported else "-"
+            print(f"  {stage:<8}{seconds:>9.2f}s  {rate}")
+        for filename, error in self.failures[:20]:
+            print(f"  failed: {filename}: {error}")
+        if len(self.failures) > 20:
+            print(f"  ... and {len(self.failures) - 20} more failures")
+
+def main():
+    import llm
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="directory of PDFs (searched recursively) or a .zip archive")
+    parser.add_argument("--owner", required=True, help="email of the recruiter the candidates are imported for")
+    parser.add_argument("--chunk", type=int, default=200, help="files per chunk; each chunk is committed as a whole")
+    parser.add_argument("--concurrency", type=int, default=llm.LLM_MAX_CONCURRENCY, help="LLM completions in flight")
+    parser.add_argument("--embed-batch", type=int, default=128, help="texts per embedding model call")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        sys.exit(f"{args.path} does not exist")
+    try:
+        import rag
+    except VectorLogLocked:
+        sys.exit("The vector index is in use by a running server. Stop the server, run the import, then start it again.")
+    Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    try:
+        owner = db.query(User).filter(User.email == args.owner).first()
+    finally:
+        db.close()
+    if owner is None or owner.role != "recruiter":
+        sys.exit(f"No recruiter with email {args.owner}")
+
+    # The index is saved once at the end; until then every chunk's vectors are in the log
+    rag.stop_vector_compaction.set()
+    importer = Importer(owner, args)
+    started = time.perf_counter()
+    try:
+        for number, sources in enumerate(chunked(pdf_sources(args.path), max(1, args.chunk)), 1):
+            importer.import_chunk(sources)
+            elapsed = time.perf_counter() - started
+            print(f"chunk {number}: {importer.counts['imported']} imported, {importer.counts['failed']} failed "
+                  f"({importer.counts['imported'] / elapsed:.1f} resumes/s)")
+    except KeyboardInterrupt:
+        print("\nInterrupted; run the same command again to continue")
+    finally:
+        importer.loop.close()
+        with importer.timed("save"):
+            rag.vector_store.save()
+        rag.close_stores()
+        importer.report(time.perf_counter() - started)
+
+if __name__ == "__main__":
+    main()
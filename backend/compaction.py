@@ -0,0 +1,217 @@
+import os
+import re
+import threading
+from collections import Counter
+
+# Compact, token-counted versions of resumes and job descriptions, built once when the
+# entity is stored (Candidate.compact_text, Job.compact_description) and reused by every prompt.
+RESUME_TOKEN_BUDGET = int(os.getenv("RESUME_TOKEN_BUDGET", "1200"))
+JOB_TOKEN_BUDGET = int(os.getenv("JOB_TOKEN_BUDGET", "700"))
+
+# The first count_tokens call waits this long for tiktoken's encoding, which is downloaded
+# when it isn't cached yet; until it arrives (or if it can't be loaded) tokens are estimated
+TOKENIZER_LOAD_TIMEOUT_SECONDS = float(os.getenv("TOKENIZER_LOAD_TIMEOUT_SECONDS", "5"))
+
+_encoding = None
+_encoding_loader = None
+_encoding_loaded = threading.Event()
+_encoding_lock = threading.Lock()
+
+def _load_encoding():
+    global _encoding
+    try:
+        import tiktoken
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception as e: # tiktoken missing, or offline with no cached encoding
+        print(f"tiktoken encoding unavailable, estimating tokens from length: {e}")
+    finally:
+        _encoding_loaded.set()
+
+def _get_encoding():
+    # Loaded on first use, not at import, in a thread of its own so a download that hangs
+    # holds up at most the first caller
+    global _encoding_loader
+    if _encoding_loader is None:
+        with _encoding_lock:
+            if _encoding_loader is None:
+                _encoding_loader = threading.Thread(target=_load_encoding, name="tiktoken-load", daemon=True)
+                _encoding_loader.start()
+                _encoding_loaded.wait(TOKENIZER_LOAD_TIMEOUT_SECONDS)
+    return _encoding
+
+def count_tokens(text):
+    """
+    Token count with tiktoken's cl100k_base when available (close to Llama 3's tokenizer
+    for English), otherwise ~4 characters per token.
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+_PAGE_NUMBER = re.compile(r"^(page\s*)?\d+(\s*(of|/)\s*\d+)?$", re.IGNORECASE)
+_BULLETS = re.compile(r"^[•●▪◦‣⁃∙·\-\*]+\s*")
+
+def normalize_whitespace(text):
+    """
+    Strips control characters, collapses runs of spaces, trims lines, unifies
+    bullet glyphs and keeps at most one blank line between blocks.
+    """
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    # [^\S\n] below also matches non-breaking and other Unicode spaces
+    text = re.sub(r"[^\S\n]+", " ", re.sub(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]", "", text))
+    lines = [_BULLETS.sub("- ", line.strip()) for line in text.split("\n")]
+    text = "\n".join(lines)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+def strip_repeated_lines(pages, edge_lines=3):
+    """
+    Removes headers/footers from per-page PdfReader output: lines within `edge_lines`
+    of a page's top or bottom that recur on at least half the pages, plus bare page numbers.
+    """
+    pages = [page.split("\n") for page in pages]
+    if len(pages) < 2:
+        return ["\n".join(line for line in page if not _PAGE_NUMBER.match(line.strip())) for page in pages]
+
+    def edges(lines):
+        return {line.strip().lower() for line in lines[:edge_lines] + lines[-edge_lines:] if line.strip()}
+
+    seen = Counter(line for page in pages for line in edges(page))
+    # Known section headings ("Experience") can legitimately open several pages; keep them
+    repeated = {
+        line for line, count in seen.items()
+        if count >= max(2, len(pages) / 2) and line.rstrip(":").strip() not in _RESUME_HEADINGS
+    }
+    return [
+        "\n".join(
+            line for i, line in enumerate(page)
+            if not _PAGE_NUMBER.match(line.strip())
+            and not ((i < edge_lines or i >= len(page) - edge_lines) and line.strip().lower() in repeated)
+        )
+        for page in pages
+    ]
+
+_RESUME_HEADINGS = (
+    "summary", "profile", "objective", "about", "skills", "technical skills", "core competencies",
+    "experience", "work experience", "professional experience", "employment", "employment history",
+    "projects", "education", "certifications", "certificates", "achievements", "awards",
+    "publications", "languages", "interests", "hobbies", "responsibilities", "requirements",
+    "qualifications", "nice to have", "what you will do", "about the role", "about us", "benefits",
+)
+
+def _is_heading(line):
+    stripped = line.strip().rstrip(":").strip()
+    if not stripped or len(stripped) > 40:
+        return False
+    if stripped.lower() in _RESUME_HEADINGS:
+        return True
+    # Short ALL-CAPS lines are headings in most resume templates
+    return stripped.isupper() and len(stripped.split()) <= 4 and any(c.isalpha() for c in stripped)
+
+def split_sections(text):
+    """
+    Splits text into sections at heading lines; each section is a list of lines,
+    the first being its heading (except for any preamble before the first heading).
+    """
+    sections = [[]]
+    for line in text.split("\n"):
+        if _is_heading(line) and sections[-1]:
+            sections.append([])
+        sections[-1].append(line)
+    return [section for section in sections if any(line.strip() for line in section)]
+
+_SENTENCE_END = re.compile(r"[.!?](?=\s|$)")
+_WORD = re.compile(r"\S+")
+_CHARACTER = re.compile(r".")
+
+def _cut_line(line, budget, pattern):
+    # Longest prefix of line ending at a `pattern` match that fits in budget tokens ("" if none does)
+    ends = [match.end() for match in pattern.finditer(line)]
+    low, high = 0, len(ends)
+    while low < high: # Binary search: a longer prefix never has fewer tokens
+        middle = (low + high) // 2
+        if count_tokens(line[:ends[middle]] + "\n") <= budget:
+            low = middle + 1
+        else:
+            high = middle
+    return line[:ends[low - 1]] if low else ""
+
+def _truncate_lines(lines, budget):
+    # Whole lines while they fit; the first line that doesn't is cut at the last sentence end that
+    # fits, failing that the last word end, so a section that is one long paragraph keeps its start
+    kept, used = [], 0
+    for line in lines:
+        cost = count_tokens(line + "\n")
+        if used + cost > budget:
+            for pattern in (_SENTENCE_END, _WORD, _CHARACTER):
+                cut = _cut_line(line, budget - used, pattern)
+                if cut:
+                    break
+            if cut:
+                kept.append(cut)
+            break
+        kept.append(line)
+        used += cost
+    return kept
+
+def fit_to_budget(text, budget):
+    """
+    Trims text to at most `budget` tokens without dropping whole sections:
+    every section gets an equal share of the budget (small sections such as skills
+    stay whole, their unused share goes to the long ones), and each is cut at a line or sentence boundary.
+    """
+    if count_tokens(text) <= budget:
+        return text
+    sections = split_sections(text)
+    costs = [count_tokens("\n".join(section) + "\n") for section in sections]
+
+    shares = [0] * len(sections)
+    remaining = budget
+    # Water-filling: give the smallest sections what they need first
+    order = sorted(range(len(sections)), key=lambda i: costs[i])
+    for position, i in enumerate(order):
+        share = remaining // (len(order) - position)
+        shares[i] = min(costs[i], share)
+        remaining -= shares[i]
+
+    fitted = []
+    for section, share in zip(sections, shares):
+        lines = _truncate_lines(section, share)
+        # A heading whose body didn't fit is just noise
+        if lines and (len(lines) > 1 or not _is_heading(lines[0])):
+            fitted.append("\n".join(lines))
+    return "\n".join(fitted)
+
+def compact(pages, budget):
+    """
+    Compact representation of a document given as a list of page texts (or one string).
+    Returns (text, token_count).
+    """
+    if isinstance(pages, str):
+        pages = [pages]
+    text = normalize_whitespace("\n".join(strip_repeated_lines([page or "" for page in pages])))
+    text = fit_to_budget(text, budget)
+    return text, count_tokens(text)
+
+def compact_resume(pages, budget=RESUME_TOKEN_BUDGET):
+    return compact(pages, budget)
+
+def compact_job(description, budget=JOB_TOKEN_BUDGET):
+    return compact(description or "", budget)
+
+def candidate_prompt_text(candidate):
+    """
+    The candidate's compact resume, built from raw_text (and set on the row) if it
+    predates compaction. The caller commits.
+    """
+    if candidate.compact_text is None:
+        candidate.compact_text, candidate.compact_tokens = compact_resume(candidate.raw_text or "")
+    return candidate.compact_text
+
+def job_prompt_text(job):
+    """
+    The job's compact description, built (and set on the row) if missing. The caller commits.
+    """
+    if job.compact_description is None:
+        job.compact_description, job.compact_tokens = compact_job(job.description)
+    return job.compact_description
@@ -0,0 +1,192 @@
+"""
+Local stand-in for the Groq chat completions API, for exercising llm.py under rate limits.
+
+Serves POST /openai/v1/chat/completions with canned JSON answers (single and batched
+match prompts, quiz prompts) and simulates the failure modes of the real API:
+  - a requests-per-minute budget, answered with 429 + retry-after + x-ratelimit-* headers
+  - random 429s, 5xx errors and latency spikes
+Requests with "stream": true are answered as Server-Sent Events, a few characters per chunk.
+
+    python fake_llm_server.py --port 8400 --rpm 60 --error-rate 0.05 --spike-rate 0.1
+    GROQ_BASE_URL=http://127.0.0.1:8400 uvicorn main:app
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FakeLLMState:
+    def __init__(self, rpm=0, rate_limit_rate=0.0, error_rate=0.0, spike_rate=0.0, spike_seconds=2.0, latency=0.05, outage=False, chunk_latency=0.0):
+        self.rpm = rpm
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.spike_rate = spike_rate
+        self.spike_seconds = spike_seconds
+        self.latency = latency
+        self.outage = outage
+        self.chunk_latency = chunk_latency # Delay between streamed chunks, like token generation
+        self.window = deque() # Timestamps of accepted requests in the last minute
+        self.counts = {"ok": 0, "429": 0, "5xx": 0}
+        self.lock = threading.Lock()
+
+    def admit(self):
+        """
+        Returns (status, retry_after, remaining) for an incoming request.
+        """
+        with self.lock:
+            now = time.monotonic()
+            while self.window and now - self.window[0] >= 60:
+                self.window.popleft()
+            if self.outage or random.random() < self.error_rate:
+                self.counts["5xx"] += 1
+                return 503, None, None
+            if self.rpm and len(self.window) >= self.rpm:
+                self.counts["429"] += 1
+                return 429, 60 - (now - self.window[0]), 0
+            if random.random() < self.rate_limit_rate:
+                self.counts["429"] += 1
+                return 429, random.uniform(0.1, 1.0), 0
+            self.window.append(now)
+            self.counts["ok"] += 1
+            return 200, None, (self.rpm - len(self.window)) if self.rpm else 1000
+
+def answer(prompt):
+    # Deterministic scores derived from the prompt, so repeated runs are comparable
+    def scores(seed):
+        rng = random.Random(seed)
+        skill, experience = rng.randint(20, 95), rng.randint(20, 95)
+        return {
+            "skill_match_percentage": skill,
+            "experience_match_percentage": experience,
+            "overall_match_score": round((skill + experience) / 2),
+            "reasoning": "Fake LLM score",
+        }
+
+    candidate_ids = re.findall(r"Candidate ID: (\d+)", prompt)
+    if candidate_ids:
+        return {"results": [dict(candidate_id=int(candidate_id), **scores(candidate_id + prompt[:200])) for candidate_id in candidate_ids]}
+    if "AI Recruiter" in prompt:
+        return scores(prompt)
+    if "Multiple Choice Questions" in prompt:
+        return {"questions": [
+            {"question": f"Fake question {i + 1}?", "options": ["A", "B", "C", "D"], "correct_answer": "A"}
+            for i in range(10)
+        ]}
+    return {"name": "Fake Candidate", "skills": "python", "total_experience": 3, "current_role": "Engineer", "companies": "Acme"}
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body, headers=None):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _stream(self, body, content, remaining):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("x-ratelimit-remaining-requests", str(remaining))
+            self.send_header("x-ratelimit-reset-requests", "1s")
+            self.end_headers()
+            chunk_id = f"chatcmpl-fake-{random.getrandbits(32):08x}"
+            pieces = [content[i:i + 16] for i in range(0, len(content), 16)]
+            for i, piece in enumerate(pieces):
+                self.wfile.write(b"data: " + json.dumps({
+                    "id": chunk_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": "stop" if i == len(pieces) - 1 else None}],
+                }).encode("utf-8") + b"\n\n")
+                self.wfile.flush()
+                time.sleep(state.chunk_latency)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            status, retry_after, remaining = state.admit()
+
+            delay = state.latency
+            if random.random() < state.spike_rate:
+                delay += state.spike_seconds
+            time.sleep(delay)
+
+            if status == 503:
+                self._send(503, {"error": {"message": "Service unavailable (simulated)", "type": "internal_server_error"}})
+                return
+            if status == 429:
+                self._send(429, {"error": {"message": "Rate limit reached (simulated)", "type": "tokens", "code": "rate_limit_exceeded"}}, {
+                    "retry-after": f"{retry_after:.2f}",
+                    "x-ratelimit-remaining-requests": "0",
+                    "x-ratelimit-reset-requests": f"{retry_after:.2f}s",
+                })
+                return
+
+            prompt = body["messages"][-1]["content"]
+            content = json.dumps(answer(prompt), indent=2)
+            if body.get("stream"):
+                self._stream(body, content, remaining)
+                return
+            prompt_tokens, completion_tokens = len(prompt) // 4, len(content) // 4
+            self._send(200, {
+                "id": f"chatcmpl-fake-{random.getrandbits(32):08x}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+            }, {
+                "x-ratelimit-remaining-requests": str(remaining),
+                "x-ratelimit-reset-requests": "1s",
+            })
+    return Handler
+
+def start(port=0, **options):
+    """
+    Starts the fake server on a background thread. Returns (server, state); server.server_port has the port.
+    """
+    state = FakeLLMState(**options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8400)
+    parser.add_argument("--rpm", type=int, default=0, help="requests per minute before 429s (0 = unlimited)")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with a random 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--spike-rate", type=float, default=0.0, help="fraction of requests delayed by --spike-seconds")
+    parser.add_argument("--spike-seconds", type=float, default=2.0)
+    parser.add_argument("--latency", type=float, default=0.05, help="base latency in seconds")
+    parser.add_argument("--chunk-latency", type=float, default=0.0, help="delay between streamed chunks in seconds")
+    args = parser.parse_args()
+
+    server, state = start(
+        args.port, rpm=args.rpm, rate_limit_rate=args.rate_limit_rate, error_rate=args.error_rate,
+        spike_rate=args.spike_rate, spike_seconds=args.spike_seconds, latency=args.latency,
+        chunk_latency=args.chunk_latency
+    )
+    print(f"Fake LLM server on http://127.0.0.1:{server.server_port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"  served: {state.counts}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,475 @@
+import datetime
+import hashlib
+import os
+import queue
+import socket
+import threading
+import time
+import unicodedata
+import uuid
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from database import SessionLocal
+from models import IngestionJob, Candidate, Application, Job, MatchResult, User
+import llm
+import rag
+import compaction
+import metrics
+import pdf_extract
+
+# Resume uploads are processed off the request: the route stores the PDF, records an
+# IngestionJob and returns 202; the stages below (parse -> extract -> embed -> match)
+# each run on their own worker threads, connected by bounded queues. An upload matching
+# the candidate's stored resume (same file, or same text) skips straight to matching.
+INGEST_DIR = os.getenv("INGEST_DIR", "uploads")
+# Uploads waiting to be parsed; when full, new uploads are turned away with 503 instead of piling up
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "100"))
+# Workers per stage: parsing is CPU-bound, extraction and matching mostly wait on the LLM
+INGEST_PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", "2"))
+INGEST_EXTRACT_WORKERS = int(os.getenv("INGEST_EXTRACT_WORKERS", "4"))
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "2"))
+INGEST_MATCH_WORKERS = int(os.getenv("INGEST_MATCH_WORKERS", "4"))
+# Uploads are copied to INGEST_DIR this many bytes at a time
+UPLOAD_CHUNK_BYTES = 64 * 1024
+# Extracted text shorter than this (after normalization) isn't fingerprinted: scanned or image-only
+# PDFs yield little or no text, and would all look like the same resume
+TEXT_FINGERPRINT_MIN_CHARS = int(os.getenv("TEXT_FINGERPRINT_MIN_CHARS", "200"))
+# Unfinished uploads of a server on another host are only taken over once untouched this long
+INGEST_STALE_SECONDS = int(os.getenv("INGEST_STALE_SECONDS", "900"))
+
+# Owner of the jobs this process accepts (IngestionJob.worker)
+HOSTNAME = socket.gethostname()
+WORKER_ID = f"{HOSTNAME}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+class IngestionQueueFull(Exception):
+    """The pipeline is at capacity; the upload was not accepted."""
+
+class UploadTooLarge(Exception):
+    """The upload is over PDF_MAX_BYTES; nothing was stored."""
+
+class IngestionError(Exception):
+    """The upload can't be processed; the message is shown to the user."""
+
+class IngestionTask:
+    """
+    An IngestionJob moving through the stages, with what earlier stages produced.
+    """
+    def __init__(self, job):
+        self.id = job.id
+        self.kind = job.kind
+        self.user_id = job.user_id
+        self.job_id = job.job_id
+        self.filename = job.filename
+        self.file_path = job.file_path
+        self.content_hash = job.content_hash
+        self.enqueued_at = None
+        self.pages = None
+        self.text = None
+        self.compact_text = None
+        self.compact_tokens = None
+        self.text_hash = None
+        self.reused = None
+        # Set when an earlier run got this far before a restart, so the work isn't repeated
+        self.candidate_id = job.candidate_id
+        self.application_id = job.application_id
+        self.resumed = job.candidate_id is not None
+
+def _update(task_id, **fields):
+    db = SessionLocal()
+    try:
+        db.query(IngestionJob).filter(IngestionJob.id == task_id).update(fields)
+        db.commit()
+    finally:
+        db.close()
+
+def _record(db, task, **ids):
+    # Stores candidate_id / application_id on the task and its IngestionJob, committed with the caller's
+    # transaction: a job replayed after a restart then never creates the same row twice
+    for name, value in ids.items():
+        setattr(task, name, value)
+    db.query(IngestionJob).filter(IngestionJob.id == task.id).update(ids)
+
+def _finish(task, error=None):
+    status = "failed" if error else "done"
+    _update(task.id, status=status, error=error, reused=task.reused, candidate_id=task.candidate_id, application_id=task.application_id)
+    metrics.INGEST_JOBS.inc(kind=task.kind, outcome=status)
+    try:
+        os.remove(task.file_path)
+    except OSError:
+        pass
+
+class Stage:
+    """
+    Worker threads fed by a bounded queue. run(task) does the stage's work and returns the
+    next Stage, or None when the task is complete. Handing a task on blocks while the next
+    stage's queue is full, so a slow stage holds back the ones before it.
+    """
+    def __init__(self, name, status, run, workers, maxsize=0):
+        self.name = name
+        self.status = status
+        self.run = run
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize if maxsize > 0 else self.workers * 2)
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"ingest-{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, task, block=True):
+        task.enqueued_at = time.perf_counter()
+        self.queue.put(task, block=block)
+
+    def _work(self):
+        while True:
+            task = self.queue.get()
+            try:
+                self._process(task)
+            except Exception as e:
+                # Even recording the outcome failed (e.g. the database is down). The job stays
+                # unfinished, with its file, and is picked up again by the next start
+                print(f"Error in ingestion {self.name} stage for job {task.id}, left unfinished: {e}")
+
+    def _process(self, task):
+        metrics.INGEST_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - task.enqueued_at, stage=self.name)
+        try:
+            _update(task.id, status=self.status)
+            with metrics.INGEST_STAGE_SECONDS.time(stage=self.name):
+                next_stage = self.run(task)
+        except IngestionError as e:
+            _finish(task, str(e))
+            return
+        except Exception as e:
+            print(f"Error in ingestion {self.name} stage for job {task.id}: {e}")
+            _finish(task, f"Processing failed while {self.status}")
+            return
+        if next_stage is None:
+            _finish(task)
+        else:
+            next_stage.put(task)
+
+def text_fingerprint(text):
+    """
+    SHA-256 of resume text with Unicode forms, case and whitespace normalized, so the same
+    resume saved again (new file, same words) still matches. None if there is too little text
+    (under TEXT_FINGERPRINT_MIN_CHARS) to tell resumes apart.
+    """
+    normalized = " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+    if len(normalized) < TEXT_FINGERPRINT_MIN_CHARS:
+        return None
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+def _stored_resume(task, column, value):
+    """
+    Id of the candidate whose stored resume has this fingerprint and can stand in for the upload:
+    for 'apply', the user's profile (the one _extract would update); for 'resume', any candidate
+    the user uploaded before. None for a missing fingerprint.
+    """
+    if value is None:
+        return None
+    db = SessionLocal()
+    try:
+        query = db.query(Candidate).filter(Candidate.user_id == task.user_id)
+        if task.kind == "apply":
+            candidate = query.first()
+            if candidate is None or getattr(candidate, column) != value:
+                return None
+        else:
+            candidate = query.filter(getattr(Candidate, column) == value).first()
+        return candidate.id if candidate else None
+    finally:
+        db.close()
+
+def _reuse(task, candidate_id, reused):
+    # The stored extraction, text and vector stand; only the application is new
+    task.reused = reused
+    metrics.INGEST_REUSED.inc(kind=task.kind, match=reused)
+    db = SessionLocal()
+    try:
+        _record(db, task, candidate_id=candidate_id)
+        if task.kind == "resume":
+            db.commit()
+            return None
+        candidate = db.query(Candidate).filter(Candidate.id == candidate_id).first()
+        candidate.resume_filename = task.filename
+        candidate.resume_sha256 = task.content_hash
+        db.commit()
+        _create_application(db, task, candidate)
+    finally:
+        db.close()
+    return match_stage
+
+def _parse(task):
+    # A job resumed after a restart already has its candidate, which the checks below would find
+    if task.content_hash and not task.resumed:
+        candidate_id = _stored_resume(task, "resume_sha256", task.content_hash)
+        if candidate_id is not None:
+            return _reuse(task, candidate_id, "file")
+
+    try:
+        # Parsed in pdf_extract's process pool, within its page, size and time limits;
+        # the worker reads the file itself
+        task.pages, task.text = pdf_extract.extract_text(task.file_path)
+    except pdf_extract.PDFExtractionError as e:
+        raise IngestionError(str(e))
+    task.text_hash = text_fingerprint(task.text)
+    candidate_id = None if task.resumed else _stored_resume(task, "resume_text_hash", task.text_hash) # None for (near-)empty text
+    if candidate_id is not None:
+        return _reuse(task, candidate_id, "text")
+
+    # Compact once (headers/footers dropped, fitted to the token budget); prompts reuse it
+    task.compact_text, task.compact_tokens = compaction.compact_resume(task.pages)
+    return extract_stage
+
+def _extract(task):
+    db = SessionLocal()
+    try:
+        if task.candidate_id is not None:
+            # Replayed after a restart: the candidate was stored, maybe the application too
+            if task.kind == "apply" and task.application_id is None:
+                candidate = db.query(Candidate).filter(Candidate.id == task.candidate_id).first()
+                _create_application(db, task, candidate)
+            return embed_stage
+
+        structured_data = llm.extract_structured_data(task.text, task.compact_text)
+        if task.kind == "resume":
+            candidate = Candidate(
+                name=structured_data.get("name", "Unknown"),
+                email=structured_data.get("email", "Unknown"),
+                phone=structured_data.get("phone", ""),
+                skills=structured_data.get("skills", ""),
+                total_experience=structured_data.get("total_experience", 0.0),
+                current_role=structured_data.get("current_role", ""),
+                companies=structured_data.get("companies", ""),
+                raw_text=task.text,
+                compact_text=task.compact_text,
+                compact_tokens=task.compact_tokens,
+                resume_filename=task.filename,
+                resume_sha256=task.content_hash,
+                resume_text_hash=task.text_hash,
+                user_id=task.user_id
+            )
+            db.add(candidate)
+            db.flush()
+            _record(db, task, candidate_id=candidate.id)
+            db.commit()
+            return embed_stage
+
+        user = db.query(User).filter(User.id == task.user_id).first()
+        candidate = db.query(Candidate).filter(Candidate.user_id == task.user_id).first()
+        if not candidate:
+            # Create new profile
+            candidate = Candidate(
+                name=structured_data.get("name", user.name or "Unknown"),
+                email=structured_data.get("email", user.email or "Unknown"),
+                phone=structured_data.get("phone", ""),
+                skills=structured_data.get("skills", ""),
+                total_experience=structured_data.get("total_experience", 0.0),
+                current_role=structured_data.get("current_role", ""),
+                companies=structured_data.get("companies", ""),
+                raw_text=task.text,
+                compact_text=task.compact_text,
+                compact_tokens=task.compact_tokens,
+                resume_filename=task.filename,
+                resume_sha256=task.content_hash,
+                resume_text_hash=task.text_hash,
+                user_id=task.user_id
+            )
+            db.add(candidate)
+        else:
+            # Update existing profile with new resume data
+            candidate.raw_text = task.text
+            candidate.compact_text = task.compact_text
+            candidate.compact_tokens = task.compact_tokens
+            candidate.resume_filename = task.filename
+            candidate.resume_sha256 = task.content_hash
+            candidate.resume_text_hash = task.text_hash
+            candidate.skills = structured_data.get("skills", candidate.skills)
+            candidate.total_experience = structured_data.get("total_experience", candidate.total_experience)
+            candidate.current_role = structured_data.get("current_role", candidate.current_role)
+            candidate.companies = structured_data.get("companies", candidate.companies)
+        db.flush()
+        _record(db, task, candidate_id=candidate.id)
+        db.commit()
+        _create_application(db, task, candidate)
+        return embed_stage
+    finally:
+        db.close()
+
+def _create_application(db, task, candidate):
+    # The route checked this already; checked again for uploads racing each other
+    existing_application = db.query(Application).filter(
+        Application.job_id == task.job_id,
+        Application.candidate_id == candidate.id
+    ).first()
+    if existing_application:
+        raise IngestionError("You have already applied to this job")
+
+    new_application = Application(job_id=task.job_id, candidate_id=candidate.id, status="Applied")
+    db.add(new_application)
+    db.flush()
+    _record(db, task, application_id=new_application.id)
+    db.commit()
+
+def _embed(task):
+    rag.vector_store.upsert(task.candidate_id, task.text)
+    return match_stage if task.kind == "apply" else None
+
+def _match(task):
+    db = SessionLocal()
+    try:
+        candidate = db.query(Candidate).filter(Candidate.id == task.candidate_id).first()
+        job = db.query(Job).filter(Job.id == task.job_id).first()
+        match_data = llm.match_candidate(compaction.candidate_prompt_text(candidate), compaction.job_prompt_text(job))
+
+        existing_result = db.query(MatchResult).filter(MatchResult.job_id == job.id, MatchResult.candidate_id == candidate.id).first()
+        if not existing_result:
+            existing_result = MatchResult(job_id=job.id, candidate_id=candidate.id)
+            db.add(existing_result)
+        existing_result.skill_match_percentage = match_data.get("skill_match_percentage", 0)
+        existing_result.experience_match_percentage = match_data.get("experience_match_percentage", 0)
+        existing_result.overall_match_score = match_data.get("overall_match_score", 0)
+        existing_result.reasoning = match_data.get("reasoning", "")
+        existing_result.score_source = "llm"
+        existing_result.model = match_data.get("model")
+        existing_result.model_tier = match_data.get("model_tier")
+        existing_result.latency_ms = match_data.get("latency_ms")
+        db.commit()
+    except Exception as e:
+        # The application stands; the candidate is scored by the next bulk match instead
+        print(f"Error during auto-matching: {e}")
+    finally:
+        db.close()
+    return None
+
+parse_stage = Stage("parse", "parsing", _parse, INGEST_PARSE_WORKERS, INGEST_QUEUE_SIZE)
+extract_stage = Stage("extract", "extracting", _extract, INGEST_EXTRACT_WORKERS)
+embed_stage = Stage("embed", "embedding", _embed, INGEST_EMBED_WORKERS)
+match_stage = Stage("match", "matching", _match, INGEST_MATCH_WORKERS)
+_started = False
+
+def _store(upload, file_path):
+    # Copies the upload in chunks, hashing as it goes; returns the SHA-256
+    digest = hashlib.sha256()
+    size = 0
+    with open(file_path, "wb") as f:
+        while True:
+            chunk = upload.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > pdf_extract.PDF_MAX_BYTES:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+    if size > pdf_extract.PDF_MAX_BYTES:
+        os.remove(file_path)
+        raise UploadTooLarge()
+    return digest.hexdigest()
+
+def submit(db, user, kind, filename, upload, job_id=None):
+    """
+    Stores the uploaded PDF (a binary file object, copied in chunks), records an IngestionJob
+    and queues it. Returns the IngestionJob. Raises IngestionQueueFull when the pipeline can't
+    take more work right now, UploadTooLarge when the file is over PDF_MAX_BYTES.
+    """
+    if parse_stage.queue.full():
+        metrics.INGEST_JOBS.inc(kind=kind, outcome="rejected")
+        raise IngestionQueueFull()
+    os.makedirs(INGEST_DIR, exist_ok=True)
+    file_path = os.path.join(INGEST_DIR, f"{uuid.uuid4().hex}.pdf")
+    content_hash = _store(upload, file_path)
+
+    job = IngestionJob(
+        user_id=user.id, kind=kind, job_id=job_id, filename=filename, file_path=file_path,
+        content_hash=content_hash, status="pending", worker=WORKER_ID
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    try:
+        parse_stage.put(IngestionTask(job), block=False)
+    except queue.Full:
+        # Lost a race for the last slot
+        job.status, job.error = "failed", "Too many uploads in progress, please try again"
+        db.commit()
+        os.remove(file_path)
+        metrics.INGEST_JOBS.inc(kind=kind, outcome="rejected")
+        raise IngestionQueueFull()
+    metrics.INGEST_JOBS.inc(kind=kind, outcome="queued")
+    return job
+
+async def submit_upload(db, user, kind, file, job_id=None):
+    """
+    submit() for an UploadFile in an async route: runs it in the threadpool (the body is
+    already spooled to a temp file, see upload_limit, and is copied in chunks, never read
+    whole into memory) and answers refusals as HTTP errors: 413 too large, 503 queue full.
+    """
+    too_large = HTTPException(status_code=413, detail=f"PDF is larger than {pdf_extract.PDF_MAX_BYTES // (1024 * 1024)} MB")
+    if file.size is not None and file.size > pdf_extract.PDF_MAX_BYTES:
+        raise too_large
+    try:
+        return await run_in_threadpool(submit, db, user, kind, file.filename, file.file, job_id=job_id)
+    except UploadTooLarge:
+        raise too_large
+    except IngestionQueueFull:
+        raise HTTPException(status_code=503, detail="Too many uploads in progress, please try again shortly", headers={"Retry-After": "10"})
+
+def _abandoned(job, stale_before):
+    """
+    Whether no running server is processing the job. This process holds the vector store's lock
+    (see VectorLog), so no other server on this host is running: jobs owned by an earlier process
+    here were left by a restart. Jobs of another host are only taken over once they go stale.
+    """
+    if job.worker == WORKER_ID:
+        return False
+    if job.worker is None or job.worker.split(":", 1)[0] == HOSTNAME:
+        return True
+    return job.updated_at is not None and job.updated_at < stale_before
+
+def _claim(db, job):
+    # Compare-and-set on the owner read above: of several processes requeueing at once, one wins
+    owner = IngestionJob.worker.is_(None) if job.worker is None else IngestionJob.worker == job.worker
+    claimed = db.query(IngestionJob).filter(
+        IngestionJob.id == job.id, owner, IngestionJob.status.notin_(["done", "failed"])
+    ).update({"worker": WORKER_ID}, synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+def _requeue_unfinished():
+    # Uploads accepted before a restart start over from parsing; the PDF is still on disk.
+    # Candidates and applications they already created are reused (IngestionJob.candidate_id / application_id)
+    stale_before = datetime.datetime.utcnow() - datetime.timedelta(seconds=INGEST_STALE_SECONDS)
+    db = SessionLocal()
+    tasks = []
+    try:
+        unfinished = db.query(IngestionJob).filter(IngestionJob.status.notin_(["done", "failed"])).order_by(IngestionJob.id).all()
+        for job in unfinished:
+            if not _abandoned(job, stale_before) or not _claim(db, job):
+                continue
+            db.refresh(job)
+            if job.file_path and os.path.exists(job.file_path):
+                tasks.append(IngestionTask(job))
+            else:
+                job.status, job.error = "failed", "The upload was lost in a restart, please upload again"
+                db.commit()
+    finally:
+        db.close()
+    if tasks:
+        print(f"Requeueing {len(tasks)} unfinished resume uploads")
+    for task in tasks:
+        parse_stage.put(task)
+
+def start():
+    """
+    Starts the worker threads and requeues uploads left unfinished by the last run. Idempotent.
+    """
+    global _started
+    if _started:
+        return
+    _started = True
+    for stage in (parse_stage, extract_stage, embed_stage, match_stage):
+        stage.start()
+    threading.Thread(target=_requeue_unfinished, name="ingest-requeue", daemon=True).start()
@@ -0,0 +1,124 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from sqlalchemy.orm import Session
+from models import Job, JobEmbedding
+import rag
+
+# Stacked matrices kept per distinct list of jobs (all jobs, one job for a match, ...)
+JOB_MATRIX_CACHE_SIZE = int(os.getenv("JOB_MATRIX_CACHE_SIZE", "8"))
+
+class JobEmbeddingCache:
+    """
+    Job description embeddings, computed once per description and persisted in
+    the job_embeddings table keyed by a hash of the description.
+    Keeps an in-process copy so scoring all jobs is a single matrix-vector product,
+    and mirrors every embedding into rag.job_store for top-N job search.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = {} # job_id -> (description_hash, normalized vector)
+        self._matrices = OrderedDict() # tuple of job IDs -> stacked rows, least recently used first
+        self._sync_lock = threading.Lock()
+        self._synced = False # rag.job_store checked against the jobs table
+
+    def store(self, db: Session, job: Job):
+        """
+        Embeds a job's description and persists it. Call on create / edit.
+        """
+        self._compute(db, [job])
+
+    def matrix(self, db: Session, jobs):
+        """
+        Returns a (len(jobs), dimension) matrix of normalized embeddings,
+        row-aligned with `jobs`. Missing or stale rows are filled in first.
+        """
+        stale = [job for job in jobs if not self._is_fresh(job)]
+        if stale:
+            self._load(db, stale)
+
+        job_ids = tuple(job.id for job in jobs)
+        with self._lock:
+            matrix = self._matrices.get(job_ids)
+            if matrix is not None:
+                self._matrices.move_to_end(job_ids)
+                return matrix
+            if job_ids:
+                matrix = np.stack([self._rows[job_id][1] for job_id in job_ids])
+            else:
+                matrix = np.zeros((0, rag.dimension), dtype=np.float32)
+            matrix.setflags(write=False) # Shared by every caller with the same jobs
+            self._matrices[job_ids] = matrix
+            if len(self._matrices) > JOB_MATRIX_CACHE_SIZE:
+                self._matrices.popitem(last=False)
+            return matrix
+
+    def _is_fresh(self, job):
+        row = self._rows.get(job.id)
+        return row is not None and row[0] == rag.text_hash(job.description)
+
+    def _load(self, db, jobs):
+        # Another worker may already have stored these; only embed what is really missing
+        stored = db.query(JobEmbedding).filter(JobEmbedding.job_id.in_([job.id for job in jobs])).all()
+        stored = {row.job_id: row for row in stored}
+
+        missing = []
+        with self._lock:
+            for job in jobs:
+                row = stored.get(job.id)
+                if row is not None and row.description_hash == rag.text_hash(job.description):
+                    self._set(job.id, row.description_hash, np.frombuffer(row.embedding, dtype=np.float32))
+                else:
+                    missing.append(job)
+
+        if missing:
+            self._compute(db, missing, stored)
+
+    def _compute(self, db, jobs, stored=None):
+        if stored is None:
+            rows = db.query(JobEmbedding).filter(JobEmbedding.job_id.in_([job.id for job in jobs])).all()
+            stored = {row.job_id: row for row in rows}
+
+        vectors = rag.normalize(rag.get_embeddings([job.description or "" for job in jobs]))
+        for job, vector in zip(jobs, vectors):
+            description_hash = rag.text_hash(job.description)
+            row = stored.get(job.id)
+            if row is None:
+                row = JobEmbedding(job_id=job.id)
+                db.add(row)
+            row.description_hash = description_hash
+            row.embedding = vector.tobytes()
+            with self._lock:
+                self._set(job.id, description_hash, vector)
+        db.commit()
+        rag.job_store.upsert_vectors([job.id for job in jobs], vectors)
+
+    def sync_index(self, db: Session):
+        """
+        Makes rag.job_store hold exactly the jobs in the database: adds jobs created
+        before the index existed and drops jobs deleted outside the API. Compares the
+        ID sets once per process; after that store() keeps the index current, so
+        later calls return straight away.
+        """
+        if self._synced:
+            return
+        with self._sync_lock:
+            if self._synced:
+                return
+            job_ids = {job_id for (job_id,) in db.query(Job.id)}
+            indexed = rag.job_store.ids()
+            for job_id in indexed - job_ids:
+                rag.job_store.delete(job_id)
+            missing = db.query(Job).filter(Job.id.in_(job_ids - indexed)).all() if job_ids - indexed else []
+            if missing:
+                rag.job_store.upsert_vectors([job.id for job in missing], self.matrix(db, missing))
+            self._synced = True
+
+    def _set(self, job_id, description_hash, vector):
+        self._rows[job_id] = (description_hash, vector)
+        # Stacked matrices holding this job are stale now
+        for job_ids in [job_ids for job_ids in self._matrices if job_id in job_ids]:
+            del self._matrices[job_ids]
+
+job_embedding_cache = JobEmbeddingCache()
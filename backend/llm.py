@@ -1,20 +1,40 @@
 import os
 import json
 from dotenv import load_dotenv
-from groq import Groq
+import asyncio
+import time
+from contextlib import contextmanager
+from llm_cache import llm_cache, cache_key, ttl_for
+from llm_client import LLMError
+from llm_providers import Routed, build_router, use_workload
+import compaction
+import metrics
 
 load_dotenv()
 
-# Initialize Groq Client
+# Completions go through a router over the configured providers (LLM_PROVIDERS):
+# Groq by default, optionally a local Ollama / OpenAI-compatible model for failover and bulk work.
 # Ensure GROQ_API_KEY is set in .env
-client = Groq(
-    api_key=os.environ.get("GROQ_API_KEY"),
-)
+router = build_router()
 
-def query_llm(prompt, model="llama-3.1-8b-instant", json_mode=True):
-    """
-    Query Groq API with Llama 3 model.
-    """
+# Bulk fan-out (e.g. /match/{job_id}) keeps at most LLM_MAX_CONCURRENCY calls in flight
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+
+# Batched matching: up to MATCH_BATCH_SIZE resumes scored against one job per completion
+MATCH_BATCH_SIZE = int(os.getenv("MATCH_BATCH_SIZE", "5"))
+
+# Cascade: MATCH_MODEL scores first; with MATCH_CASCADE=1, scores inside the borderline band
+# [MATCH_BORDERLINE_LOW, MATCH_BORDERLINE_HIGH] and unusable answers are re-scored by MATCH_ESCALATION_MODEL
+MATCH_MODEL = os.getenv("MATCH_MODEL", "llama-3.1-8b-instant")
+MATCH_ESCALATION_MODEL = os.getenv("MATCH_ESCALATION_MODEL", "llama-3.3-70b-versatile")
+MATCH_CASCADE = os.getenv("MATCH_CASCADE", "0") == "1"
+MATCH_BORDERLINE_LOW = float(os.getenv("MATCH_BORDERLINE_LOW", "40"))
+MATCH_BORDERLINE_HIGH = float(os.getenv("MATCH_BORDERLINE_HIGH", "70"))
+
+# Prompts take the compact texts from compaction.py (Candidate.compact_text, Job.compact_description),
+# which are already fitted to a token budget, instead of slicing raw text.
+
+def _completion_kwargs(prompt, model, json_mode):
     messages = [
         {"role": "user", "content": prompt}
     ]
@@ -27,11 +47,103 @@ def query_llm(prompt, model="llama-3.1-8b-instant", json_mode=True):
     
     if json_mode:
         kwargs["response_format"] = {"type": "json_object"}
-        
+    return kwargs
+
+def _cache_key(kwargs, model):
+    return cache_key(model, kwargs["temperature"], kwargs["messages"][0]["content"], kwargs.get("response_format"))
+
+def _cache_lookup(kwargs, call_type):
+    """
+    (cached response, model that produced it), or (None, None) on a miss or when this call type
+    isn't cached. Responses are keyed by the model that answered, not the one requested, so the
+    lookup is for the model the router would use now (e.g. the local one for bulk work).
+    """
+    if llm_cache is None or ttl_for(call_type) <= 0:
+        return None, None
+    model = router.preferred_model(kwargs["model"])
+    cached = llm_cache.get(_cache_key(kwargs, model))
+    metrics.LLM_CACHE_REQUESTS.inc(call_type=call_type, result="miss" if cached is None else "hit")
+    return cached, model
+
+def _cache_store(kwargs, routed, call_type, json_mode, validate=None):
+    # Only successful responses are cached, so errors and malformed JSON are retried next time
+    response = routed.content
+    if llm_cache is None or ttl_for(call_type) <= 0 or not response:
+        return
+    if json_mode:
+        try:
+            json.loads(response)
+        except ValueError:
+            return
+    if validate is not None and not validate(response):
+        return
+    llm_cache.set(_cache_key(kwargs, routed.model), response, ttl_for(call_type), call_type)
+
+@contextmanager
+def _measured(call_type):
+    # Latency per call type; also labels the token usage the provider reports with it
+    started = time.perf_counter()
+    outcome = "error"
     try:
-        chat_completion = client.chat.completions.create(**kwargs)
-        return chat_completion.choices[0].message.content
-    except Exception as e:
+        with metrics.llm_call(call_type):
+            yield
+        outcome = "ok"
+    finally:
+        metrics.LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, call_type=call_type or "other", outcome=outcome)
+
+def _complete(prompt, model, json_mode, call_type, validate):
+    # Routed(response, model that answered it)
+    kwargs = _completion_kwargs(prompt, model, json_mode)
+    cached, cached_model = _cache_lookup(kwargs, call_type)
+    if cached is not None:
+        return Routed(cached, cached_model)
+    with _measured(call_type):
+        routed = router.complete(**kwargs)
+    _cache_store(kwargs, routed, call_type, json_mode, validate)
+    return routed
+
+async def _acomplete(prompt, model, json_mode, call_type, validate):
+    kwargs = _completion_kwargs(prompt, model, json_mode)
+    cached, cached_model = _cache_lookup(kwargs, call_type)
+    if cached is not None:
+        return Routed(cached, cached_model)
+    with _measured(call_type):
+        routed = await router.acomplete(**kwargs)
+    _cache_store(kwargs, routed, call_type, json_mode, validate)
+    return routed
+
+def complete_llm(prompt, model="llama-3.1-8b-instant", json_mode=True, call_type=None, validate=None):
+    """
+    Like query_llm, but raises LLMError when no completion could be obtained.
+    validate(response) -> bool decides whether a response is worth caching.
+    """
+    return _complete(prompt, model, json_mode, call_type, validate).content
+
+async def acomplete_llm(prompt, model="llama-3.1-8b-instant", json_mode=True, call_type=None, validate=None):
+    """
+    Async version of complete_llm.
+    """
+    return (await _acomplete(prompt, model, json_mode, call_type, validate)).content
+
+def query_llm(prompt, model="llama-3.1-8b-instant", json_mode=True, call_type=None):
+    """
+    Query Groq API with Llama 3 model.
+    Identical requests are answered from llm_cache; call_type picks the cache TTL.
+    Returns None if the request failed.
+    """
+    try:
+        return complete_llm(prompt, model, json_mode, call_type)
+    except LLMError as e:
+        print(f"Error querying Groq: {e}")
+        return None
+
+async def aquery_llm(prompt, model="llama-3.1-8b-instant", json_mode=True, call_type=None):
+    """
+    Async version of query_llm, for running many completions concurrently.
+    """
+    try:
+        return await acomplete_llm(prompt, model, json_mode, call_type)
+    except LLMError as e:
         print(f"Error querying Groq: {e}")
         return None
 
@@ -56,12 +168,8 @@ def extract_contact_info(text):
 
     return {"email": email, "phone": phone.strip()}
 
-def extract_structured_data(text):
-    # 1. Fast Extraction (Regex)
-    contact_info = extract_contact_info(text)
-
-    # 2. Context Extraction (LLM) - Skip already extracted fields
-    prompt = f"""
+def _extract_prompt(compact_text):
+    return f"""
     Extract the following information from the resume text below and return strictly as a JSON object.
     
     JSON Schema:
@@ -74,9 +182,10 @@ def extract_structured_data(text):
     }}
     
     Resume Text:
-    {text[:6000]}
+    {compact_text}
     """
-    response = query_llm(prompt)
+
+def _merge_extraction(response, contact_info):
     structured_data = {}
     try:
         structured_data = json.loads(response)
@@ -89,8 +198,47 @@ def extract_structured_data(text):
     
     return structured_data
 
-def match_candidate(resume_text, job_description):
-    prompt = f"""
+def extract_structured_data(text, compact_text=None):
+    # 1. Fast Extraction (Regex) on the full text
+    contact_info = extract_contact_info(text)
+    if compact_text is None:
+        compact_text, _ = compaction.compact_resume(text)
+
+    # 2. Context Extraction (LLM) - Skip already extracted fields
+    response = query_llm(_extract_prompt(compact_text), call_type="extract")
+    return _merge_extraction(response, contact_info)
+
+async def aextract_structured_data(text, compact_text=None):
+    """
+    Async version of extract_structured_data; raises LLMError instead of returning
+    only the regex fields when the completion fails.
+    """
+    contact_info = extract_contact_info(text)
+    if compact_text is None:
+        compact_text, _ = compaction.compact_resume(text)
+    response = await acomplete_llm(_extract_prompt(compact_text), call_type="extract")
+    return _merge_extraction(response, contact_info)
+
+async def extract_many_concurrently(items, concurrency=LLM_MAX_CONCURRENCY):
+    """
+    Extracts many (text, compact_text) resumes with at most `concurrency` completions
+    in flight. Results come back in the same order as `items`, with None for resumes
+    the LLM couldn't process.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(text, compact_text):
+        async with semaphore:
+            try:
+                return await aextract_structured_data(text, compact_text)
+            except LLMError as e:
+                print(f"Error extracting resume: {e}")
+                return None
+
+    return await asyncio.gather(*(run(text, compact_text) for text, compact_text in items))
+
+def _match_prompt(resume_text, job_description):
+    return f"""
     You are an AI Recruiter. Compare the candidate's resume with the job description.
     Return the result strictly in this JSON format:
     {{
@@ -101,22 +249,262 @@ def match_candidate(resume_text, job_description):
     }}
 
     Job Description:
-    {job_description[:3000]}
+    {job_description}
 
     Resume:
-    {resume_text[:3000]}
+    {resume_text}
+    """
+
+def _parse_match(response):
+    """
+    Validated match data from a single-resume response; raises LLMError rather than
+    inventing zero scores for a response that can't be used.
     """
-    response = query_llm(prompt)
-    if not response:
-        return {"skill_match_percentage": 0, "experience_match_percentage": 0, "overall_match_score": 0, "reasoning": "Error querying LLM"}
-        
     try:
-        return json.loads(response)
-    except:
-        return {"skill_match_percentage": 0, "experience_match_percentage": 0, "overall_match_score": 0, "reasoning": "Error parsing LLM response"}
+        match = _valid_match(json.loads(response))
+    except (TypeError, ValueError):
+        match = None
+    if match is None:
+        raise LLMError("Unusable LLM match response")
+    return match
 
-def generate_quiz_questions(job_description):
-    prompt = f"""
+def _is_valid_match_response(response):
+    try:
+        _parse_match(response)
+        return True
+    except LLMError:
+        return False
+
+def _is_borderline(match):
+    return MATCH_BORDERLINE_LOW <= match["overall_match_score"] <= MATCH_BORDERLINE_HIGH
+
+def _annotate(match, model, tier, started, spent_ms=0.0):
+    # Which model and cascade tier produced the score, and the LLM time spent on it
+    return dict(match, model=model, model_tier=tier, latency_ms=round(spent_ms + (time.perf_counter() - started) * 1000, 1))
+
+def _score(resume_text, job_description, model):
+    # (match data, model that answered)
+    routed = _complete(_match_prompt(resume_text, job_description), model, True, "match", _is_valid_match_response)
+    return _parse_match(routed.content), routed.model
+
+async def _ascore(resume_text, job_description, model):
+    routed = await _acomplete(_match_prompt(resume_text, job_description), model, True, "match", _is_valid_match_response)
+    return _parse_match(routed.content), routed.model
+
+def match_candidate(resume_text, job_description):
+    """
+    Scores one resume against a job; raises LLMError if the candidate couldn't be scored.
+    With MATCH_CASCADE on, a borderline or unusable answer from MATCH_MODEL is
+    re-scored by MATCH_ESCALATION_MODEL. The result records model, model_tier and latency_ms.
+    """
+    started = time.perf_counter()
+    try:
+        match, model = _score(resume_text, job_description, MATCH_MODEL)
+    except LLMError:
+        if not MATCH_CASCADE:
+            raise
+        match = None
+    if match is not None and not (MATCH_CASCADE and _is_borderline(match)):
+        return _annotate(match, model, "base", started)
+    try:
+        escalated, escalated_model = _score(resume_text, job_description, MATCH_ESCALATION_MODEL)
+        return _annotate(escalated, escalated_model, "escalated", started)
+    except LLMError:
+        if match is None:
+            raise
+        # Escalation failed, but the cheap score is still a real answer
+        return _annotate(match, model, "base", started)
+
+async def amatch_candidate(resume_text, job_description):
+    started = time.perf_counter()
+    try:
+        match, model = await _ascore(resume_text, job_description, MATCH_MODEL)
+    except LLMError:
+        if not MATCH_CASCADE:
+            raise
+        match = None
+    if match is not None and not (MATCH_CASCADE and _is_borderline(match)):
+        return _annotate(match, model, "base", started)
+    try:
+        escalated, escalated_model = await _ascore(resume_text, job_description, MATCH_ESCALATION_MODEL)
+        return _annotate(escalated, escalated_model, "escalated", started)
+    except LLMError:
+        if match is None:
+            raise
+        return _annotate(match, model, "base", started)
+
+async def match_candidates_concurrently(pairs, concurrency=LLM_MAX_CONCURRENCY):
+    """
+    Scores many (resume_text, job_description) pairs with at most `concurrency`
+    completions in flight. Results come back in the same order as `pairs`,
+    with None for pairs that couldn't be scored.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(resume_text, job_description):
+        async with semaphore:
+            try:
+                return await amatch_candidate(resume_text, job_description)
+            except LLMError as e:
+                print(f"Error matching candidate: {e}")
+                return None
+
+    return await asyncio.gather(*(run(resume_text, job_description) for resume_text, job_description in pairs))
+
+def _batch_match_prompt(job_description, items):
+    resumes = "\n\n".join(
+        f"Candidate ID: {candidate_id}\nResume:\n{resume_text}"
+        for candidate_id, resume_text in items
+    )
+    return f"""
+    You are an AI Recruiter. Compare each candidate's resume with the job description.
+    Score every candidate independently. Return strictly a JSON object in this format,
+    with exactly one entry per candidate ID listed below:
+    {{
+        "results": [
+            {{
+                "candidate_id": number,
+                "skill_match_percentage": number (0-100),
+                "experience_match_percentage": number (0-100),
+                "overall_match_score": number (0-100),
+                "reasoning": "short explanation"
+            }}
+        ]
+    }}
+
+    Job Description:
+    {job_description}
+
+    Candidates:
+    {resumes}
+    """
+
+MATCH_SCORE_FIELDS = ("skill_match_percentage", "experience_match_percentage", "overall_match_score")
+
+def _valid_match(entry):
+    """
+    Returns the entry's scores and reasoning if every field is present and in range, else None.
+    """
+    if not isinstance(entry, dict):
+        return None
+    result = {}
+    for field in MATCH_SCORE_FIELDS:
+        value = entry.get(field)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 100:
+            return None
+        result[field] = value
+    if not isinstance(entry.get("reasoning"), str):
+        return None
+    result["reasoning"] = entry["reasoning"]
+    return result
+
+def _parse_batch_match(response, candidate_ids):
+    """
+    Maps candidate_id -> match data for the entries of a batched response that pass validation.
+    Unknown, duplicated or malformed entries are dropped.
+    """
+    try:
+        entries = json.loads(response).get("results") if response else None
+    except (ValueError, AttributeError):
+        entries = None
+    if not isinstance(entries, list):
+        return {}
+
+    wanted = {str(candidate_id): candidate_id for candidate_id in candidate_ids}
+    results = {}
+    duplicated = set()
+    for entry in entries:
+        raw_id = entry.get("candidate_id") if isinstance(entry, dict) else None
+        if isinstance(raw_id, bool) or not isinstance(raw_id, (int, str)) or str(raw_id).strip() not in wanted:
+            continue
+        candidate_id = wanted[str(raw_id).strip()]
+        match = _valid_match(entry)
+        if match is None:
+            continue
+        if candidate_id in results:
+            duplicated.add(candidate_id)
+        results[candidate_id] = match
+    # Two answers for one candidate: trust neither
+    for candidate_id in duplicated:
+        del results[candidate_id]
+    return results
+
+async def match_batches_concurrently(job_description, items, batch_size=MATCH_BATCH_SIZE, concurrency=LLM_MAX_CONCURRENCY):
+    """
+    Scores (candidate_id, compact resume text) items against one job, batch_size resumes per
+    completion and at most `concurrency` completions in flight.
+    Candidates missing or malformed in a batched answer are re-scored with a single-resume call;
+    with MATCH_CASCADE they, and borderline scores, go to MATCH_ESCALATION_MODEL instead.
+    Returns candidate_id -> match data; candidates that couldn't be scored at all are left out.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def single(candidate_id, resume_text):
+        async with semaphore:
+            try:
+                return candidate_id, await amatch_candidate(resume_text, job_description)
+            except LLMError as e:
+                print(f"Error matching candidate {candidate_id}: {e}")
+                return candidate_id, None
+
+    async def escalate(candidate_id, resume_text, spent_ms):
+        # Straight to the larger model: the cheap one already answered (borderline) or failed in the batch
+        started = time.perf_counter()
+        async with semaphore:
+            try:
+                match, model = await _ascore(resume_text, job_description, MATCH_ESCALATION_MODEL)
+            except LLMError as e:
+                print(f"Error escalating candidate {candidate_id}: {e}")
+                return candidate_id, None
+        return candidate_id, _annotate(match, model, "escalated", started, spent_ms)
+
+    async def batch(chunk):
+        if len(chunk) == 1:
+            candidate_id, match = await single(*chunk[0])
+            return {candidate_id: match} if match is not None else {}
+
+        candidate_ids = [candidate_id for candidate_id, _ in chunk]
+        started = time.perf_counter()
+        async with semaphore:
+            try:
+                response, model = await _acomplete(
+                    _batch_match_prompt(job_description, chunk), MATCH_MODEL, True, "match",
+                    # Cache only answers that cover the whole batch
+                    lambda r: len(_parse_batch_match(r, candidate_ids)) == len(chunk)
+                )
+            except LLMError as e:
+                print(f"Error in batched match: {e}")
+                response, model = None, MATCH_MODEL
+        spent_ms = (time.perf_counter() - started) * 1000 / len(chunk) # The batch's time, shared out
+        results = {
+            candidate_id: dict(match, model=model, model_tier="base", latency_ms=round(spent_ms, 1))
+            for candidate_id, match in _parse_batch_match(response, candidate_ids).items()
+        }
+
+        missing = [(candidate_id, resume_text) for candidate_id, resume_text in chunk if candidate_id not in results]
+        if missing:
+            print(f"Batched match returned no valid result for {len(missing)} of {len(chunk)} candidates; scoring them individually")
+        if MATCH_CASCADE:
+            retries = [
+                escalate(candidate_id, resume_text, spent_ms) for candidate_id, resume_text in chunk
+                if candidate_id not in results or _is_borderline(results[candidate_id])
+            ]
+        else:
+            retries = [single(*item) for item in missing]
+        for candidate_id, match in await asyncio.gather(*retries):
+            if match is not None:
+                results[candidate_id] = match
+        return results
+
+    batch_size = max(1, batch_size)
+    chunks = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    merged = {}
+    for results in await asyncio.gather(*(batch(chunk) for chunk in chunks)):
+        merged.update(results)
+    return merged
+
+def _quiz_prompt(job_description):
+    return f"""
     Generate 10 Multiple Choice Questions (MCQs) based on the following job description.
     Return strictly as a JSON object containing a key "questions" which is an array of objects.
     
@@ -132,9 +520,11 @@ def generate_quiz_questions(job_description):
     }}
 
     Job Description:
-    {job_description[:3000]}
+    {job_description}
     """
-    response = query_llm(prompt)
+
+def generate_quiz_questions(job_description):
+    response = query_llm(_quiz_prompt(job_description), call_type="quiz")
     if not response:
         return []
 
@@ -145,3 +535,88 @@ def generate_quiz_questions(job_description):
         return data.get("questions", [])
     except:
         return []
+
+class ArrayItemParser:
+    """
+    Incremental JSON scanner for streamed completions: feed() it text as it arrives and it
+    returns the objects that have just been closed inside an array, e.g. each element of
+    {"questions": [...]} as soon as its closing brace streams in. Text outside JSON is ignored.
+    """
+    def __init__(self):
+        self.buffer = ""
+        self.stack = [] # Open containers, "{" or "["
+        self.in_string = False
+        self.escaped = False
+        self.item_start = None # Buffer offset and depth of the array element being read
+        self.item_depth = None
+
+    def feed(self, text):
+        items = []
+        offset = len(self.buffer)
+        self.buffer += text
+        for i, char in enumerate(text, offset):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = bool(self.stack)
+            elif char in "{[":
+                if char == "{" and self.item_start is None and self.stack and self.stack[-1] == "[":
+                    self.item_start, self.item_depth = i, len(self.stack)
+                self.stack.append(char)
+            elif char in "}]" and self.stack:
+                self.stack.pop()
+                if self.item_start is not None and len(self.stack) == self.item_depth:
+                    try:
+                        items.append(json.loads(self.buffer[self.item_start:i + 1]))
+                    except ValueError:
+                        pass
+                    self.item_start = None
+        return items
+
+def _is_valid_question(question):
+    return (
+        isinstance(question, dict)
+        and isinstance(question.get("question"), str)
+        and isinstance(question.get("options"), list) and len(question["options"]) >= 2
+        and question.get("correct_answer") in question["options"]
+    )
+
+def _has_questions(response):
+    return any(_is_valid_question(question) for question in ArrayItemParser().feed(response))
+
+async def astream_llm(prompt, model="llama-3.1-8b-instant", json_mode=True, call_type=None, validate=None):
+    """
+    Streaming version of acomplete_llm: yields the completion text as it is generated
+    (a cached response comes back in one piece) and caches the full text once the stream ends.
+    Raises LLMError.
+    """
+    kwargs = _completion_kwargs(prompt, model, json_mode)
+    cached, _ = _cache_lookup(kwargs, call_type)
+    if cached is not None:
+        yield cached
+        return
+    parts = []
+    served_model = None
+    with _measured(call_type):
+        async for delta, served_model in router.astream(**kwargs):
+            parts.append(delta)
+            yield delta
+    if served_model is not None:
+        _cache_store(kwargs, Routed("".join(parts), served_model), call_type, json_mode, validate)
+
+async def astream_quiz_questions(job_description):
+    """
+    Yields quiz questions one at a time as the completion streams in.
+    Raises LLMError if the stream fails; questions already yielded are complete and valid.
+    """
+    parser = ArrayItemParser()
+    # No JSON mode: not every provider supports it on streamed completions, and the parser skips stray text anyway
+    async for delta in astream_llm(_quiz_prompt(job_description), json_mode=False, call_type="quiz", validate=_has_questions):
+        for question in parser.feed(delta):
+            if _is_valid_question(question):
+                yield question
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Persistent cache of LLM responses, keyed by everything that determines the completion.
+# Stored in a local SQLite file so it survives restarts and is shared by workers on the same host.
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.db")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+
+# Seconds a response stays valid, per call type. 0 disables caching for that call type.
+LLM_CACHE_TTL = {
+    "extract": int(os.getenv("LLM_CACHE_TTL_EXTRACT", str(30 * 24 * 3600))),
+    "match": int(os.getenv("LLM_CACHE_TTL_MATCH", str(7 * 24 * 3600))),
+    "quiz": int(os.getenv("LLM_CACHE_TTL_QUIZ", str(24 * 3600))),
+}
+LLM_CACHE_DEFAULT_TTL = int(os.getenv("LLM_CACHE_TTL_DEFAULT", str(24 * 3600)))
+
+def cache_key(model, temperature, prompt, response_format=None):
+    """
+    Content address of a completion: sha256 over model, temperature, prompt and response_format.
+    """
+    payload = json.dumps([model, temperature, prompt, response_format], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def ttl_for(call_type):
+    return LLM_CACHE_TTL.get(call_type, LLM_CACHE_DEFAULT_TTL)
+
+class LLMCache:
+    """
+    Size-bounded LRU cache of LLM responses with per-entry expiry.
+    Once it holds more than max_entries, the least recently used entries are evicted.
+    """
+    def __init__(self, path=LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY,"
+            " call_type TEXT,"
+            " response TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_last_used ON llm_cache (last_used)")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                if row is not None:
+                    self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, response, ttl, call_type=None):
+        if ttl <= 0:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, call_type, response, expires_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, call_type, response, now + ttl, now)
+            )
+            self._evict()
+
+    def _evict(self):
+        # Drop expired entries first, then the least recently used ones beyond the bound
+        self.evictions += self._conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+        excess = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self.evictions += self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_used LIMIT ?)", (excess,)
+            ).rowcount
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "enabled": LLM_CACHE_ENABLED,
+            "entries": size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+llm_cache = LLMCache() if LLM_CACHE_ENABLED else None
@@ -0,0 +1,339 @@
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+import groq
+import httpx
+import metrics
+
+# Optional client-side budgets, so bulk work runs at the sustainable rate instead of bouncing off 429s.
+# Off (0) by default: the provider's own limits still apply, since its x-ratelimit-* and retry-after
+# headers pause every caller until the reset. Set them to your plan's published limits (for Groq,
+# console.groq.com/settings/limits) to pace requests before the provider has to refuse any.
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "0"))
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "0"))
+# Completion tokens assumed per request until the real usage comes back (only used with LLM_TPM_LIMIT)
+LLM_COMPLETION_TOKEN_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKEN_ESTIMATE", "400"))
+
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+
+# Circuit breaker: after LLM_BREAKER_FAILURES consecutive failed calls, fail fast for LLM_BREAKER_RESET_SECONDS
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+class LLMError(Exception):
+    """The completion could not be obtained (after retries, if the error was transient)."""
+
+class LLMUnavailableError(LLMError):
+    """The circuit breaker is open; the call was not attempted."""
+
+class ProviderHTTPError(Exception):
+    """Non-2xx answer from a provider called over plain HTTP."""
+    def __init__(self, status_code, headers, message=""):
+        super().__init__(f"HTTP {status_code}: {message}")
+        self.status_code = status_code
+        self.headers = headers
+
+# What a provider's send function returns
+Completion = namedtuple("Completion", ["content", "headers", "total_tokens", "prompt_tokens", "completion_tokens"], defaults=(None, None))
+
+# Errors where the request never got an HTTP answer; worth retrying
+CONNECTION_ERRORS = (groq.APIConnectionError, httpx.TransportError)
+
+def estimate_tokens(kwargs):
+    # ~4 characters per token is close enough for budgeting
+    prompt_chars = sum(len(message["content"]) for message in kwargs["messages"])
+    return prompt_chars // 4 + LLM_COMPLETION_TOKEN_ESTIMATE
+
+def parse_duration(value):
+    """
+    Seconds in a retry-after / x-ratelimit-reset-* header: "7", "7.66s", "2m59.56s", "120ms".
+    Returns None if the header is missing or unreadable.
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(amount) * scale[unit] for amount, unit in parts)
+
+class TokenBucket:
+    """
+    Refills at per_minute / 60 units a second, up to per_minute.
+    reserve() always succeeds but may leave the bucket in debt; the caller then
+    waits the returned number of seconds, so concurrent callers queue up in order.
+    """
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount):
+        if self.capacity <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            self.tokens -= min(amount, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+
+    def adjust(self, delta):
+        # Correct an earlier reservation once the real cost is known
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + delta)
+
+class CircuitBreaker:
+    """
+    closed: calls go through. open: calls fail fast with LLMUnavailableError.
+    After reset_seconds one probe call is let through (half-open); its outcome closes or re-opens the circuit.
+    A probe that ends without an outcome (cancelled, stream abandoned) must call release_probe().
+    """
+    def __init__(self, failure_threshold=LLM_BREAKER_FAILURES, reset_seconds=LLM_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        """
+        Raises LLMUnavailableError while the circuit is open. Returns True if this call is the half-open probe.
+        """
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return False
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            retry_in = max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+            raise LLMUnavailableError(f"LLM circuit open after {self.failures} consecutive failures; retry in {retry_in:.0f}s")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def release_probe(self):
+        # No-op once the probe recorded an outcome; otherwise nothing was learned, so wait out another reset period
+        with self._lock:
+            if self._probing:
+                self._probing = False
+                self.opened_at = time.monotonic()
+
+class RateLimitedClient:
+    """
+    Wraps a provider's chat completion calls (sync or async) with RPM/TPM token buckets,
+    retries with jittered exponential backoff that honour retry-after and rate-limit
+    headers, and a circuit breaker. Raises LLMError instead of returning nothing.
+    """
+    def __init__(self, rpm=LLM_RPM_LIMIT, tpm=LLM_TPM_LIMIT, max_retries=LLM_MAX_RETRIES, breaker=None):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self._paused_until = 0.0 # Set from rate-limit headers: nobody sends before this
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+
+    def _wait_for_budget(self, estimated):
+        wait = max(self.requests.reserve(1), self.tokens.reserve(estimated))
+        return max(wait, self._paused_until - time.monotonic())
+
+    def _pause(self, seconds):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _observe_headers(self, headers):
+        # Groq reports its own view of the budget; if it says we're out, stop everyone until the reset
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            if remaining is not None and reset and remaining.strip() == "0":
+                self._pause(reset)
+
+    def _retry_delay(self, error, attempt):
+        """
+        Seconds to wait before retrying `error`, or None if it should not be retried.
+        """
+        if not self._is_transient(error):
+            return None # Bad request, auth, etc.: retrying won't help
+        status = getattr(error, "status_code", None)
+        if status == 429:
+            self.rate_limited += 1
+        if attempt >= self.max_retries:
+            return None
+        metrics.LLM_RETRIES.inc(reason="rate_limited" if status == 429 else "server_error" if status else "connection")
+
+        backoff = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt)) # Full jitter
+        headers = getattr(error, "headers", None) or getattr(getattr(error, "response", None), "headers", None)
+        if headers is not None:
+            self._observe_headers(headers)
+            retry_after = parse_duration(headers.get("retry-after"))
+            if retry_after is not None:
+                self._pause(retry_after)
+                return retry_after + random.uniform(0, LLM_BACKOFF_BASE)
+        return backoff
+
+    def _is_transient(self, error):
+        status = getattr(error, "status_code", None)
+        if status is not None:
+            return status == 429 or status >= 500
+        return isinstance(error, CONNECTION_ERRORS)
+
+    def _give_up(self, error):
+        # Every failed call counts towards the breaker: a non-transient 4xx (bad key, unknown
+        # model, request the provider rejects) is not retried, but the provider didn't answer either
+        self.failures += 1
+        self.breaker.record_failure()
+        raise LLMError(f"LLM request failed: {error}") from error
+
+    def _finish(self, completion, estimated):
+        self.breaker.record_success()
+        self._observe_headers(completion.headers)
+        if completion.total_tokens:
+            self.tokens.adjust(estimated - completion.total_tokens)
+        call_type = metrics.llm_call_type.get()
+        if completion.prompt_tokens:
+            metrics.LLM_TOKENS.inc(completion.prompt_tokens, call_type=call_type, kind="prompt")
+        if completion.completion_tokens:
+            metrics.LLM_TOKENS.inc(completion.completion_tokens, call_type=call_type, kind="completion")
+        return completion.content
+
+    def complete(self, send, **kwargs):
+        """
+        Calls send(**kwargs) -> Completion within budget, retrying transient errors.
+        Returns the completion text or raises LLMError.
+        """
+        probe = self.breaker.before_call()
+        try:
+            estimated = estimate_tokens(kwargs)
+            self.calls += 1
+            attempt = 0
+            while True:
+                time.sleep(self._wait_for_budget(estimated))
+                try:
+                    completion = send(**kwargs)
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        self._give_up(e)
+                    self.retries += 1
+                    attempt += 1
+                    time.sleep(delay)
+                    continue
+                return self._finish(completion, estimated)
+        finally:
+            if probe:
+                self.breaker.release_probe()
+
+    async def acomplete(self, send, **kwargs):
+        """
+        Async version of complete; send is a coroutine function.
+        """
+        probe = self.breaker.before_call()
+        try:
+            estimated = estimate_tokens(kwargs)
+            self.calls += 1
+            attempt = 0
+            while True:
+                await asyncio.sleep(self._wait_for_budget(estimated))
+                try:
+                    completion = await send(**kwargs)
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        self._give_up(e)
+                    self.retries += 1
+                    attempt += 1
+                    await asyncio.sleep(delay)
+                    continue
+                return self._finish(completion, estimated)
+        finally:
+            # Cancelled (e.g. the client went away) before an outcome was recorded
+            if probe:
+                self.breaker.release_probe()
+
+    async def astream(self, open_stream, **kwargs):
+        """
+        Streaming version of acomplete: open_stream(**kwargs) is a coroutine returning
+        (headers, async iterator of text deltas). Opening the stream is budgeted and retried
+        like a call; once text is flowing, a broken stream raises LLMError.
+        """
+        probe = self.breaker.before_call()
+        try:
+            estimated = estimate_tokens(kwargs)
+            self.calls += 1
+            attempt = 0
+            while True:
+                await asyncio.sleep(self._wait_for_budget(estimated))
+                try:
+                    headers, deltas = await open_stream(**kwargs)
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        self._give_up(e)
+                    self.retries += 1
+                    attempt += 1
+                    await asyncio.sleep(delay)
+                    continue
+                break
+            self._observe_headers(headers)
+            try:
+                async for delta in deltas:
+                    yield delta
+            except Exception as e:
+                self._give_up(e)
+            self.breaker.record_success()
+        finally:
+            # Cancelled, or the consumer stopped reading (SSE client disconnected), before an outcome was recorded
+            if probe:
+                self.breaker.release_probe()
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "failures": self.failures,
+            "breaker": self.breaker.state,
+        }
@@ -0,0 +1,323 @@
+import contextvars
+import json
+import os
+import random
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+import httpx
+from dotenv import load_dotenv
+from groq import Groq, AsyncGroq
+from llm_client import RateLimitedClient, LLMError, Completion, ProviderHTTPError
+import metrics
+
+load_dotenv()
+
+# Providers to route between, in order of preference until latency has been measured.
+# "groq" = hosted Groq API, "ollama" = local Ollama (or any OpenAI-compatible server)
+LLM_PROVIDERS = [name.strip() for name in os.getenv("LLM_PROVIDERS", "groq").split(",") if name.strip()]
+# Provider tried first for bulk work (see use_workload); empty = route bulk work like everything else
+LLM_BULK_PROVIDER = os.getenv("LLM_BULK_PROVIDER", "")
+
+# Groq
+# Retries are done by RateLimitedClient (budget-aware, with a circuit breaker), not by the SDK.
+# GROQ_BASE_URL can point at a local fake server (see fake_llm_server.py).
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+
+# Local model over the OpenAI-compatible API (Ollama serves it under /v1).
+# OLLAMA_BASE_URL may be the /api/generate URL used by test_ollama.py.
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/api/generate")
+LOCAL_LLM_BASE_URL = os.getenv("LOCAL_LLM_BASE_URL") or f"{OLLAMA_BASE_URL.replace('/api/generate', '').rstrip('/')}/v1"
+LOCAL_LLM_MODEL = os.getenv("LOCAL_LLM_MODEL", "llama3")
+LOCAL_LLM_API_KEY = os.getenv("LOCAL_LLM_API_KEY", "ollama")
+LOCAL_LLM_TIMEOUT_SECONDS = float(os.getenv("LOCAL_LLM_TIMEOUT_SECONDS", "120"))
+# Fail over quickly instead of retrying a local server that isn't running
+LOCAL_LLM_MAX_RETRIES = int(os.getenv("LOCAL_LLM_MAX_RETRIES", "1"))
+
+# Routing: EWMA weight of the newest sample, and how fast an old error rate is forgiven
+LLM_ROUTER_EWMA_ALPHA = float(os.getenv("LLM_ROUTER_EWMA_ALPHA", "0.2"))
+LLM_ROUTER_ERROR_HALF_LIFE = float(os.getenv("LLM_ROUTER_ERROR_HALF_LIFE", "60"))
+# Share of calls led by a provider other than the best-scoring one, so providers that have no
+# measurements yet (or only old ones) get measured instead of waiting for a failover; 0 disables
+LLM_ROUTER_EXPLORE_RATE = float(os.getenv("LLM_ROUTER_EXPLORE_RATE", "0.05"))
+
+# A routed completion (or streamed piece of one) and the model that actually produced it,
+# which differs from the requested one when a local provider answered
+Routed = namedtuple("Routed", ["content", "model"])
+
+# "interactive" (default) or "bulk"; set with use_workload() around offline jobs
+workload = contextvars.ContextVar("llm_workload", default="interactive")
+
+@contextmanager
+def use_workload(name):
+    """
+    Marks LLM calls made inside the block (including asyncio tasks started in it) as `name`.
+    """
+    token = workload.set(name)
+    try:
+        yield
+    finally:
+        workload.reset(token)
+
+class Provider:
+    """
+    A chat completion backend behind a RateLimitedClient, with live latency and error-rate measurements.
+    Subclasses implement _send / _asend returning a Completion, and _aopen_stream for streaming.
+    """
+    def __init__(self, name, limiter):
+        self.name = name
+        self.limiter = limiter
+        self.latency = None # EWMA seconds per successful call, None until measured
+        self._error_rate = 0.0
+        self._error_at = time.monotonic()
+
+    def model_for(self, model):
+        return model
+
+    @property
+    def error_rate(self):
+        # Decays towards 0 while the provider isn't used, so a recovered backend gets traffic again
+        return self._error_rate * 0.5 ** ((time.monotonic() - self._error_at) / LLM_ROUTER_ERROR_HALF_LIFE)
+
+    def available(self):
+        return self.limiter.breaker.state != "open"
+
+    def score(self):
+        """
+        Expected cost of a call; lower is better. Unmeasured providers sort last
+        (LLMRouter explores them now and then).
+        """
+        if self.latency is None:
+            return float("inf")
+        return self.latency * (1 + 4 * self.error_rate)
+
+    def _record(self, seconds):
+        alpha = LLM_ROUTER_EWMA_ALPHA
+        self._error_rate = (1 - alpha) * self.error_rate + alpha * (seconds is None)
+        self._error_at = time.monotonic()
+        metrics.LLM_PROVIDER_CALLS.inc(provider=self.name, outcome="error" if seconds is None else "ok")
+        if seconds is not None:
+            self.latency = seconds if self.latency is None else (1 - alpha) * self.latency + alpha * seconds
+
+    def complete(self, **kwargs):
+        kwargs["model"] = self.model_for(kwargs["model"])
+        started = time.perf_counter()
+        try:
+            content = self.limiter.complete(self._send, **kwargs)
+        except LLMError:
+            self._record(None)
+            raise
+        self._record(time.perf_counter() - started)
+        return content
+
+    async def acomplete(self, **kwargs):
+        kwargs["model"] = self.model_for(kwargs["model"])
+        started = time.perf_counter()
+        try:
+            content = await self.limiter.acomplete(self._asend, **kwargs)
+        except LLMError:
+            self._record(None)
+            raise
+        self._record(time.perf_counter() - started)
+        return content
+
+    async def astream(self, **kwargs):
+        """
+        Yields the completion text as it is generated.
+        """
+        kwargs["model"] = self.model_for(kwargs["model"])
+        started = time.perf_counter()
+        try:
+            async for delta in self.limiter.astream(self._aopen_stream, **kwargs):
+                yield delta
+        except LLMError:
+            self._record(None)
+            raise
+        self._record(time.perf_counter() - started)
+
+    def stats(self):
+        return dict(
+            self.limiter.stats(),
+            latency_ms=None if self.latency is None else round(self.latency * 1000, 1),
+            error_rate=round(self.error_rate, 3),
+        )
+
+class GroqProvider(Provider):
+    def __init__(self, limiter=None):
+        super().__init__("groq", limiter or RateLimitedClient())
+        options = dict(api_key=os.environ.get("GROQ_API_KEY"), base_url=GROQ_BASE_URL, timeout=LLM_TIMEOUT_SECONDS, max_retries=0)
+        self.client = Groq(**options)
+        self.async_client = AsyncGroq(**options)
+
+    @staticmethod
+    def _completion(raw, completion):
+        usage = completion.usage
+        if usage is None:
+            return Completion(completion.choices[0].message.content, raw.headers, None)
+        return Completion(completion.choices[0].message.content, raw.headers, usage.total_tokens, usage.prompt_tokens, usage.completion_tokens)
+
+    def _send(self, **kwargs):
+        raw = self.client.chat.completions.with_raw_response.create(**kwargs)
+        return self._completion(raw, raw.parse())
+
+    async def _asend(self, **kwargs):
+        raw = await self.async_client.chat.completions.with_raw_response.create(**kwargs)
+        return self._completion(raw, await raw.parse())
+
+    async def _aopen_stream(self, **kwargs):
+        stream = await self.async_client.chat.completions.create(stream=True, **kwargs)
+        return stream.response.headers, (chunk.choices[0].delta.content or "" async for chunk in stream if chunk.choices)
+
+async def _sse_deltas(response):
+    # Text deltas of an OpenAI-style SSE stream ("data: {chunk}" lines, ending with "data: [DONE]")
+    try:
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            choices = json.loads(data).get("choices") or []
+            if choices:
+                yield (choices[0].get("delta") or {}).get("content") or ""
+    finally:
+        await response.aclose()
+
+class OpenAICompatibleProvider(Provider):
+    """
+    Any server speaking the OpenAI chat completions API (Ollama, vLLM, llama.cpp server).
+    Runs a single local model whatever model name the caller asked for.
+    """
+    def __init__(self, name, base_url, model, api_key=None, timeout=LOCAL_LLM_TIMEOUT_SECONDS, limiter=None):
+        super().__init__(name, limiter or RateLimitedClient(rpm=0, tpm=0, max_retries=LOCAL_LLM_MAX_RETRIES))
+        self.model = model
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.http = httpx.Client(base_url=base_url, headers=headers, timeout=timeout)
+        self.async_http = httpx.AsyncClient(base_url=base_url, headers=headers, timeout=timeout)
+
+    def model_for(self, model):
+        return self.model
+
+    @staticmethod
+    def _completion(response):
+        if response.status_code >= 400:
+            raise ProviderHTTPError(response.status_code, response.headers, response.text[:200])
+        body = response.json()
+        usage = body.get("usage") or {}
+        return Completion(
+            body["choices"][0]["message"]["content"], response.headers,
+            usage.get("total_tokens"), usage.get("prompt_tokens"), usage.get("completion_tokens")
+        )
+
+    def _send(self, **kwargs):
+        return self._completion(self.http.post("/chat/completions", json=kwargs))
+
+    async def _asend(self, **kwargs):
+        return self._completion(await self.async_http.post("/chat/completions", json=kwargs))
+
+    async def _aopen_stream(self, **kwargs):
+        request = self.async_http.build_request("POST", "/chat/completions", json=dict(kwargs, stream=True))
+        response = await self.async_http.send(request, stream=True)
+        if response.status_code >= 400:
+            await response.aread()
+            await response.aclose()
+            raise ProviderHTTPError(response.status_code, response.headers, response.text[:200])
+        return response.headers, _sse_deltas(response)
+
+class LLMRouter:
+    """
+    Sends each call to the provider with the best measured latency / error rate,
+    skipping providers whose circuit is open, and fails over to the next one on LLMError.
+    Bulk work goes to bulk_provider first when one is configured.
+    """
+    def __init__(self, providers, bulk_provider=None):
+        if not providers:
+            raise ValueError("At least one LLM provider is required")
+        self.providers = providers
+        self.bulk_provider = bulk_provider
+
+    def _ranked(self):
+        ordered = sorted(self.providers, key=lambda provider: provider.score()) # Stable: ties keep config order
+        if self._pinned():
+            ordered.sort(key=lambda provider: provider.name != self.bulk_provider)
+        healthy = [provider for provider in ordered if provider.available()]
+        # All circuits open: try anyway, the breakers will fail fast
+        return healthy or ordered
+
+    def _pinned(self):
+        return workload.get() == "bulk" and bool(self.bulk_provider)
+
+    def candidates(self):
+        """
+        Providers to try, in order. Usually best score first; with probability LLM_ROUTER_EXPLORE_RATE
+        another provider leads, so its latency is measured. The rest still follow as failover.
+        """
+        ranked = self._ranked()
+        if len(ranked) > 1 and not self._pinned() and random.random() < LLM_ROUTER_EXPLORE_RATE:
+            explored = random.choice(ranked[1:])
+            ranked = [explored] + [provider for provider in ranked if provider is not explored]
+        return ranked
+
+    def preferred_model(self, model):
+        """
+        The model a request for `model` would be answered by if the best-scoring provider succeeds.
+        """
+        return self._ranked()[0].model_for(model)
+
+    def complete(self, **kwargs):
+        """
+        Returns Routed(text, model that answered).
+        """
+        error = None
+        for provider in self.candidates():
+            try:
+                return Routed(provider.complete(**dict(kwargs)), provider.model_for(kwargs["model"]))
+            except LLMError as e:
+                error = e
+                print(f"LLM provider {provider.name} failed: {e}")
+        raise error
+
+    async def acomplete(self, **kwargs):
+        error = None
+        for provider in self.candidates():
+            try:
+                return Routed(await provider.acomplete(**dict(kwargs)), provider.model_for(kwargs["model"]))
+            except LLMError as e:
+                error = e
+                print(f"LLM provider {provider.name} failed: {e}")
+        raise error
+
+    async def astream(self, **kwargs):
+        """
+        Streams from the best provider as Routed(text delta, model). Fails over only until the first
+        text has been yielded; after that a broken stream raises LLMError, since the caller already has part of it.
+        """
+        error = None
+        for provider in self.candidates():
+            streaming = False
+            model = provider.model_for(kwargs["model"])
+            try:
+                async for delta in provider.astream(**dict(kwargs)):
+                    streaming = True
+                    yield Routed(delta, model)
+                return
+            except LLMError as e:
+                if streaming:
+                    raise
+                error = e
+                print(f"LLM provider {provider.name} failed: {e}")
+        raise error
+
+    def stats(self):
+        return {provider.name: provider.stats() for provider in self.providers}
+
+def build_provider(name):
+    if name == "groq":
+        return GroqProvider()
+    if name == "ollama":
+        return OpenAICompatibleProvider("ollama", LOCAL_LLM_BASE_URL, LOCAL_LLM_MODEL, LOCAL_LLM_API_KEY)
+    raise ValueError(f"Unknown LLM provider: {name}")
+
+def build_router():
+    return LLMRouter([build_provider(name) for name in LLM_PROVIDERS], LLM_BULK_PROVIDER or None)
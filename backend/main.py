@@ -1,13 +1,44 @@
-from fastapi import FastAPI
+if __name__ == "__main__":
+    # `python main.py` hands over to the uvicorn CLI before importing anything else, so the
+    # app (vector store, ingestion threads) is only ever built in the one serving process:
+    # not here, not again in a reload supervisor, and not in multiprocessing children, which
+    # skip re-importing a `-m` package's __main__.
+    import os
+    import sys
+    port = int(os.environ.get("PORT", 8000))
+    env = os.environ.get("ENV", "development")
+    reload = env == "development"
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "0.0.0.0", "--port", str(port)]
+    os.execv(sys.executable, command + (["--reload"] if reload else []))
+
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from database import engine, Base
+import metrics
+import migrations
+import pdf_extract
+import rag
+import upload_limit
 from routes import resume, job, match, quiz_routes, ranking, auth_routes
-import uvicorn
 
-# Create Database Tables
+# Create Database Tables, and add columns newer than an existing table
 Base.metadata.create_all(bind=engine)
+migrations.upgrade(engine)
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    # Vector writes already acknowledged may still be queued for the log flushers
+    rag.close_stores()
+
+app = FastAPI(title="AI Candidate Screening System", lifespan=lifespan)
 
-app = FastAPI(title="AI Candidate Screening System")
+# Multipart bodies over the PDF size limit are refused before (or while) they are received.
+# Added before CORS so it runs inside it, and the 413 still carries the CORS headers.
+app.add_middleware(upload_limit.UploadSizeLimit, max_bytes=pdf_extract.PDF_MAX_BYTES + upload_limit.MULTIPART_OVERHEAD_BYTES)
 
 # CORS Setup
 app.add_middleware(
@@ -18,6 +49,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+metrics.instrument_engine(engine)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    db_time = [0.0]
+    token = metrics.request_db_time.set(db_time)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        metrics.request_db_time.reset(token)
+    # Route template, not the raw path, so IDs don't explode the label set
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method, route=path, status=response.status_code)
+    metrics.DB_SECONDS_PER_REQUEST.observe(db_time[0], method=request.method, route=path)
+    return response
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Include Routers
 app.include_router(resume.router, prefix="/api", tags=["Resume"])
 app.include_router(job.router, prefix="/api", tags=["Job"])
@@ -28,9 +81,16 @@ app.include_router(auth_routes.router, prefix="/api/auth", tags=["Auth"])
 from routes import application
 app.include_router(application.router, prefix="/api", tags=["Application"])
 
-if __name__ == "__main__":
-    import os
-    port = int(os.environ.get("PORT", 8000))
-    env = os.environ.get("ENV", "development")
-    reload = env == "development"
-    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=reload)
+import ingestion
+
+# Resume uploads are processed by the ingestion pipeline's worker threads
+ingestion.start()
+
+from llm_cache import llm_cache
+
+@app.get("/api/llm/cache-stats", tags=["LLM"])
+def llm_cache_stats():
+    # Hit/miss counters are per process; entries are shared through the cache file
+    if llm_cache is None:
+        return {"enabled": False}
+    return llm_cache.stats()
@@ -0,0 +1,151 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# In-process counters and histograms, rendered in the Prometheus text format on GET /metrics.
+# Values are per worker process; scrape each worker (or run one) to see everything.
+
+_registry = []
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = dict(self._values)
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+# Seconds; spans a FAISS lookup (~1ms) to a slow LLM completion (~1min)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {} # label key -> [per-bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][slot] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def collect(self):
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+def render():
+    """
+    All metrics in the Prometheus text exposition format (version 0.0.4).
+    """
+    return "\n".join(line for metric in _registry for line in metric.collect()) + "\n"
+
+# LLM calls (llm.py, llm_client.py, llm_providers.py)
+LLM_REQUEST_SECONDS = Histogram("llm_request_duration_seconds", "LLM completion latency, cache hits excluded", ["call_type", "outcome"])
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported by the provider", ["call_type", "kind"])
+LLM_CACHE_REQUESTS = Counter("llm_cache_requests_total", "LLM response cache lookups", ["call_type", "result"])
+LLM_RETRIES = Counter("llm_retries_total", "LLM requests retried after a transient error", ["reason"])
+LLM_PROVIDER_CALLS = Counter("llm_provider_calls_total", "Completions per provider, after retries", ["provider", "outcome"])
+
+# Embeddings and vector search (rag.py)
+EMBEDDING_BATCH_SIZE = Histogram("embedding_batch_size", "Texts per embedding model call", buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+EMBEDDING_BATCH_SECONDS = Histogram("embedding_batch_duration_seconds", "Embedding model call latency")
+VECTOR_SEARCH_SECONDS = Histogram("vector_search_duration_seconds", "FAISS search latency", ["store"])
+
+# Resume ingestion pipeline (ingestion.py)
+INGEST_STAGE_SECONDS = Histogram("ingest_stage_duration_seconds", "Time to run one ingestion stage", ["stage"])
+INGEST_QUEUE_WAIT_SECONDS = Histogram("ingest_queue_wait_seconds", "Time an upload waited in a stage's queue", ["stage"])
+INGEST_JOBS = Counter("ingest_jobs_total", "Uploads by outcome: queued, rejected (queue full), done or failed", ["kind", "outcome"])
+INGEST_REUSED = Counter("ingest_reused_total", "Uploads matching a stored resume (by file or text hash) that skipped extraction", ["kind", "match"])
+
+# Documents and requests
+PDF_PARSE_SECONDS = Histogram("pdf_parse_duration_seconds", "PDF text extraction time per document, pool wait included", ["backend"])
+HTTP_REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Time to response headers", ["method", "route", "status"])
+DB_SECONDS_PER_REQUEST = Histogram("db_seconds_per_request", "Time spent in database queries per HTTP request", ["method", "route"])
+
+# Label of the LLM call in progress, so lower layers (token usage) can attribute it
+llm_call_type = contextvars.ContextVar("llm_call_type", default="other")
+
+@contextmanager
+def llm_call(call_type):
+    token = llm_call_type.set(call_type or "other")
+    try:
+        yield
+    finally:
+        llm_call_type.reset(token)
+
+# Seconds of database time of the HTTP request being served; a one-item list so that
+# worker threads running sync endpoints add to the same total
+request_db_time = contextvars.ContextVar("request_db_time", default=None)
+
+def instrument_engine(engine):
+    """
+    Adds every query's execution time on `engine` to the current request's DB time.
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        total = request_db_time.get()
+        if total is not None:
+            total[0] += time.perf_counter() - context._query_started
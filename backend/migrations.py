@@ -0,0 +1,52 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+import models
+
+# Columns added to tables that already existed. create_all() only creates missing tables,
+# so upgrade() adds these (and their indexes) to databases created before them.
+# (model, column, value for existing rows or None), oldest first.
+ADDED_COLUMNS = [
+    (models.MatchResult, "score_source", "llm"), # Every score stored before it was an LLM score
+    # Built from the raw text the first time a prompt needs them (compaction.*_prompt_text)
+    (models.Job, "compact_description", None),
+    (models.Job, "compact_tokens", None),
+    (models.Candidate, "compact_text", None),
+    (models.Candidate, "compact_tokens", None),
+    # Unknown for scores stored before the cascade recorded them
+    (models.MatchResult, "model", None),
+    (models.MatchResult, "model_tier", None),
+    (models.MatchResult, "latency_ms", None),
+    # Jobs accepted before this are unowned; the next start requeues any left unfinished
+    (models.IngestionJob, "worker", None),
+    # Uploads stored before these are simply never matched as a re-upload
+    (models.Candidate, "resume_sha256", None),
+    (models.Candidate, "resume_text_hash", None),
+    (models.IngestionJob, "content_hash", None),
+    (models.IngestionJob, "reused", None),
+]
+
+def upgrade(engine):
+    """
+    Adds any ADDED_COLUMNS missing from the database, with their indexes. Safe to run
+    on every start: columns and indexes that already exist are left alone.
+    """
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.begin() as conn:
+        for model, name, fill in ADDED_COLUMNS:
+            table = model.__table__
+            if table.name not in tables:
+                continue # Created just now by create_all, with every column
+            column = table.c[name]
+            if name not in {c["name"] for c in inspector.get_columns(table.name)}:
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(name)} {column_type}"))
+                if fill is not None:
+                    conn.execute(table.update().values({name: fill}))
+                print(f"Added column {table.name}.{name}")
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if column in index.columns.values() and index.name not in existing_indexes:
+                    conn.execute(CreateIndex(index))
+                    print(f"Added index {index.name}")
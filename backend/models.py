@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, Float, JSON, DateTime
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, Float, JSON, DateTime, LargeBinary
 from sqlalchemy.orm import relationship
 from database import Base
 import datetime
@@ -24,10 +24,22 @@ class Job(Base):
     description = Column(Text)
     requirements = Column(Text)
     recruiter_id = Column(Integer, ForeignKey("users.id"))
+    compact_description = Column(Text) # Whitespace-normalized, token-budgeted description used in prompts
+    compact_tokens = Column(Integer)
 
     recruiter = relationship("User", back_populates="jobs")
     applications = relationship("Application", back_populates="job")
 
+class JobEmbedding(Base):
+    __tablename__ = "job_embeddings"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("jobs.id"), unique=True, index=True)
+    description_hash = Column(String(64), index=True) # sha256 of Job.description
+    embedding = Column(LargeBinary) # L2-normalized float32 vector bytes
+
+    job = relationship("Job")
+
 class Candidate(Base):
     __tablename__ = "candidates"
 
@@ -41,7 +53,11 @@ class Candidate(Base):
     current_role = Column(String(255))
     companies = Column(Text) # Comma-separated or JSON string
     raw_text = Column(Text)
+    compact_text = Column(Text) # raw_text without headers/footers, fitted to RESUME_TOKEN_BUDGET; used in prompts
+    compact_tokens = Column(Integer)
     resume_filename = Column(String(255))
+    resume_sha256 = Column(String(64), index=True) # Of the uploaded PDF's bytes; a re-upload of the same file reuses this row's data
+    resume_text_hash = Column(String(64)) # Of the normalized extracted text, for the same resume saved as a different file
 
     user = relationship("User", back_populates="candidate_profile")
     applications = relationship("Application", back_populates="candidate")
@@ -77,6 +93,10 @@ class MatchResult(Base):
     experience_match_percentage = Column(Float)
     overall_match_score = Column(Float)
     reasoning = Column(Text)
+    score_source = Column(String(50), default="llm") # 'llm', 'embedding' (shortlist pre-filter) or 'skills' (fast tier)
+    model = Column(String(100)) # LLM that produced the score (None for embedding / skills scores)
+    model_tier = Column(String(20)) # Cascade tier: 'base' or 'escalated'
+    latency_ms = Column(Float) # LLM time spent on this score
     
     job = relationship("Job")
     candidate = relationship("Candidate")
@@ -105,3 +125,22 @@ class FinalRanking(Base):
 
     job = relationship("Job")
     candidate = relationship("Candidate")
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    kind = Column(String(20)) # 'resume' (upload-resume) or 'apply' (apply/{job_id})
+    job_id = Column(Integer, ForeignKey("jobs.id"), nullable=True) # Job applied to, for 'apply'
+    filename = Column(String(255))
+    file_path = Column(String(500)) # Uploaded PDF, deleted once processing ends
+    content_hash = Column(String(64)) # SHA-256 of the uploaded PDF
+    status = Column(String(20), default="pending") # pending, parsing, extracting, embedding, matching, done, failed
+    error = Column(Text)
+    reused = Column(String(10), nullable=True) # 'file' or 'text' when the candidate's stored resume matched and was reused
+    candidate_id = Column(Integer, ForeignKey("candidates.id"), nullable=True)
+    application_id = Column(Integer, ForeignKey("applications.id"), nullable=True)
+    worker = Column(String(100), nullable=True) # Server process processing it (ingestion.WORKER_ID); requeues claim it atomically
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
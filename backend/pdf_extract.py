@@ -0,0 +1,146 @@
+import io
+import mmap
+import multiprocessing
+import os
+import threading
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+import metrics
+
+# PDF text extraction in a process pool, so a big or hostile PDF can't hold the GIL
+# (or a worker) for long. "pypdf" (default) or "pymupdf" (faster; needs PyMuPDF).
+PDF_BACKEND = os.getenv("PDF_BACKEND", "pypdf")
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_MAX_BYTES = int(os.getenv("PDF_MAX_BYTES", str(10 * 1024 * 1024)))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "30"))
+PDF_TIMEOUT_SECONDS = float(os.getenv("PDF_TIMEOUT_SECONDS", "20"))
+
+BACKENDS = ("pypdf", "pymupdf")
+
+class PDFExtractionError(Exception):
+    """The PDF was rejected or couldn't be read; the message can be shown to the user."""
+
+def _pymupdf():
+    try:
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf # PyMuPDF < 1.24
+    return pymupdf
+
+def _read_pypdf(stream, max_pages):
+    from pypdf import PdfReader
+    pdf = PdfReader(stream)
+    if len(pdf.pages) > max_pages:
+        raise PDFExtractionError(f"PDF has {len(pdf.pages)} pages; at most {max_pages} are allowed")
+    return [page.extract_text() or "" for page in pdf.pages]
+
+def _pages_pypdf(source, max_pages):
+    if isinstance(source, bytes):
+        return _read_pypdf(io.BytesIO(source), max_pages)
+    # Memory-mapped: pages are read from the file as pypdf seeks to them, never copied into one bytes object
+    with open(source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return _read_pypdf(mapped, max_pages)
+
+def _pages_pymupdf(source, max_pages):
+    pymupdf = _pymupdf()
+    document = pymupdf.open(stream=source, filetype="pdf") if isinstance(source, bytes) else pymupdf.open(source, filetype="pdf")
+    with document:
+        if document.page_count > max_pages:
+            raise PDFExtractionError(f"PDF has {document.page_count} pages; at most {max_pages} are allowed")
+        return [page.get_text() for page in document]
+
+def extract_pages_inline(source, backend=PDF_BACKEND, max_pages=PDF_MAX_PAGES):
+    """
+    Page texts of a PDF given as bytes or a file path, parsed in the calling process.
+    Runs inside the pool workers.
+    """
+    try:
+        if backend == "pymupdf":
+            return _pages_pymupdf(source, max_pages)
+        return _pages_pypdf(source, max_pages)
+    except PDFExtractionError:
+        raise
+    except Exception as e:
+        # Parser exceptions may not pickle cleanly; send back a plain message
+        raise PDFExtractionError(f"Could not read the PDF: {e}")
+
+def join_pages(pages):
+    # One pass over the pages; never build the text with repeated +=
+    return "".join(pages)
+
+if PDF_BACKEND not in BACKENDS:
+    raise ValueError(f"Unknown PDF_BACKEND: {PDF_BACKEND}")
+if PDF_BACKEND == "pymupdf":
+    try:
+        _pymupdf()
+    except ImportError:
+        print("PDF_BACKEND=pymupdf but PyMuPDF is not installed; using pypdf")
+        PDF_BACKEND = "pypdf"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _context():
+    # Not fork: forking the server (embedding, FAISS, flusher and ingestion threads) can copy a lock
+    # another thread holds into a worker, which then deadlocks on it. forkserver forks the workers
+    # from a fresh single-threaded process with the parser preloaded; spawn where it isn't available.
+    # Both import the __main__ module in every worker unless it ran with -m: main.py hands over to
+    # `python -m uvicorn`, and scripts using the pool keep heavy imports out of module level.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["pdf_extract", "pypdf"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max(1, PDF_WORKERS), mp_context=_context())
+        return _pool
+
+def _reset_pool(pool):
+    # A stuck parse can't be cancelled, only killed: terminate the pool's workers and start over
+    global _pool
+    with _pool_lock:
+        if _pool is not pool:
+            return
+        _pool = None
+    for process in list((pool._processes or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def extract_pages(source, backend=None, timeout=PDF_TIMEOUT_SECONDS):
+    """
+    Page texts of a PDF given as bytes or a file path, parsed in the process pool within
+    PDF_MAX_BYTES, PDF_MAX_PAGES and `timeout` seconds. Pass a path where there is one:
+    only the path goes to the worker, which reads the file itself. Raises PDFExtractionError.
+    """
+    backend = backend or PDF_BACKEND
+    try:
+        size = len(source) if isinstance(source, bytes) else os.path.getsize(source)
+    except OSError as e:
+        raise PDFExtractionError(f"Could not read the PDF: {e}")
+    if size > PDF_MAX_BYTES:
+        raise PDFExtractionError(f"PDF is larger than {PDF_MAX_BYTES // (1024 * 1024)} MB")
+
+    for attempt in range(2):
+        pool = _get_pool()
+        try:
+            with metrics.PDF_PARSE_SECONDS.time(backend=backend):
+                return pool.submit(extract_pages_inline, source, backend, PDF_MAX_PAGES).result(timeout=timeout)
+        except FutureTimeout:
+            _reset_pool(pool)
+            raise PDFExtractionError(f"PDF took longer than {timeout:g}s to read")
+        except (BrokenProcessPool, CancelledError):
+            # Another file's timeout (or a crashed worker) took the pool down; retry once on a fresh one
+            _reset_pool(pool)
+            if attempt:
+                raise PDFExtractionError("Could not read the PDF: parser process crashed")
+
+def extract_text(source, backend=None):
+    """
+    (pages, text) of a PDF given as bytes or a file path; see extract_pages.
+    """
+    pages = extract_pages(source, backend)
+    return pages, join_pages(pages)
@@ -0,0 +1,133 @@
+import asyncio
+import os
+from fastapi.concurrency import run_in_threadpool
+from database import SessionLocal
+from models import Quiz
+import llm
+
+# Generate the quiz in the background as soon as a job is created, so candidates never wait on the LLM
+QUIZ_PREGENERATE = os.getenv("QUIZ_PREGENERATE", "1") == "1"
+
+# Served when the LLM returns no usable questions
+FALLBACK_QUESTIONS = [
+    {
+        "question": "What is the primary skill required for this role?",
+        "options": ["Technical Proficiency", "Communication", "Leadership", "All of the above"],
+        "correct_answer": "All of the above"
+    },
+    {
+        "question": "Which of the following is most important for a team player?",
+        "options": ["Working in isolation", "Collaboration", "Ignoring feedback", "micromanagement"],
+        "correct_answer": "Collaboration"
+    },
+    {
+        "question": "What is the best way to handle a tight deadline?",
+        "options": ["Panic", "Prioritize tasks", "Give up", "Blame others"],
+        "correct_answer": "Prioritize tasks"
+    }
+]
+
+def latest_quiz(db, job_id):
+    """
+    The job's current quiz: the newest one, which is also the one submit-quiz grades against.
+    """
+    return db.query(Quiz).filter(Quiz.job_id == job_id).order_by(Quiz.id.desc()).first()
+
+def _save_quiz(job_id, questions):
+    # Blocking DB work: called through run_in_threadpool, off the event loop
+    db = SessionLocal()
+    try:
+        quiz = Quiz(job_id=job_id, questions=questions)
+        db.add(quiz)
+        db.commit()
+        return quiz.id
+    finally:
+        db.close()
+
+# job_id -> QuizGeneration in progress (in this process)
+_in_flight = {}
+
+class QuizGeneration:
+    """
+    One quiz being generated for a job, as a task of its own: requests that need the quiz
+    follow it instead of calling the LLM again, and a client disconnecting doesn't cancel it.
+    """
+    def __init__(self, job_id, job_text, fallback=True):
+        self.job_id = job_id
+        self.fallback = fallback
+        self.questions = []
+        self.quiz_id = None
+        self.finished = False
+        self._changed = asyncio.Condition()
+        self.task = asyncio.create_task(self._run(job_text))
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _run(self, job_text):
+        try:
+            try:
+                async for question in llm.astream_quiz_questions(job_text):
+                    self.questions.append(question)
+                    await self._notify()
+            except Exception as e: # Whatever went wrong, the candidates waiting still need a quiz
+                print(f"Error generating quiz for job {self.job_id}: {e}")
+
+            if not self.questions:
+                # A background pre-generation stores nothing rather than a generic quiz,
+                # unless a candidate has asked for the quiz meanwhile (see start)
+                if not self.fallback:
+                    return
+                print("LLM returned no questions. Using fallback.")
+                self.questions.extend(FALLBACK_QUESTIONS)
+
+            self.quiz_id = await run_in_threadpool(_save_quiz, self.job_id, self.questions)
+        finally:
+            self.finished = True
+            _in_flight.pop(self.job_id, None)
+            await self._notify()
+
+    async def follow(self):
+        """
+        Yields every question of this quiz, from the first, as it is generated.
+        Ends once the quiz is stored; raises if storing it failed.
+        """
+        sent = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.finished or len(self.questions) > sent)
+            # Snapshot before yielding: the list may grow while the consumer is busy
+            new, finished = self.questions[sent:], self.finished
+            for question in new:
+                yield question
+            sent += len(new)
+            if finished and sent == len(self.questions):
+                break
+        await asyncio.shield(self.task)
+
+    async def wait(self):
+        """
+        The full list of questions once the quiz is stored.
+        """
+        await asyncio.shield(self.task)
+        return self.questions
+
+def start(job_id, job_text, fallback=True):
+    """
+    The job's quiz generation in progress, started now if there is none. Single-flight
+    per process: concurrent requests for a job without a quiz all get the same generation.
+    """
+    generation = _in_flight.get(job_id)
+    if generation is None:
+        generation = _in_flight[job_id] = QuizGeneration(job_id, job_text, fallback)
+    elif fallback:
+        generation.fallback = True
+    return generation
+
+async def pregenerate(job_id, job_text):
+    """
+    Background task run after create_job. Without fallback: if the LLM fails, the quiz is
+    generated on first request instead of storing the generic one.
+    """
+    await start(job_id, job_text, fallback=False).wait()
@@ -1,58 +1,518 @@
+import atexit
 import faiss
 import numpy as np
 import pickle
 import os
+import hashlib
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from functools import lru_cache
 from sentence_transformers import SentenceTransformer
+from vector_log import VectorLog, OP_UPSERT, OP_DELETE
+from rwlock import ReadWriteLock
+import vector_index
+import metrics
 
 # Load model locally
 model = SentenceTransformer('all-MiniLM-L6-v2')
 dimension = 384
 index_file = "faiss_index.bin"
 id_map_file = "id_map.pkl"
+vector_log_file = "vector_log.bin"
+job_index_file = "job_faiss_index.bin"
+job_vector_log_file = "job_vector_log.bin"
+
+# Background compaction: snapshot the index once the log has grown enough, checked every interval
+VECTOR_COMPACT_INTERVAL = float(os.getenv("VECTOR_COMPACT_INTERVAL", "60"))
+VECTOR_COMPACT_MIN_RECORDS = int(os.getenv("VECTOR_COMPACT_MIN_RECORDS", "500"))
+
+# Micro-batching: concurrent callers are grouped into a single encode call
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "10"))
+
+class EmbeddingBatcher:
+    """
+    Collects concurrent embedding requests into micro-batches.
+    A batch is flushed when it reaches max_batch_size or when the oldest
+    request has waited max_wait_ms, whichever comes first.
+    """
+    def __init__(self, encode, max_batch_size=EMBED_MAX_BATCH_SIZE, max_wait_ms=EMBED_MAX_WAIT_MS):
+        self.encode = encode
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, text):
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text):
+        return self.submit(text).result()
+
+    def embed_many(self, texts):
+        futures = [self.submit(text) for text in texts]
+        return np.array([f.result() for f in futures], dtype=np.float32).reshape(len(futures), dimension)
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    # Deadline passed: still take whatever is already queued
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            texts = [text for text, _ in batch]
+            metrics.EMBEDDING_BATCH_SIZE.observe(len(texts))
+            try:
+                with metrics.EMBEDDING_BATCH_SECONDS.time():
+                    vectors = self.encode(texts)
+            except Exception as e:
+                print(f"Error encoding embedding batch of {len(texts)}: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+def _encode_batch(texts):
+    return model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+
+embedder = EmbeddingBatcher(_encode_batch)
 
 def get_embedding(text):
-    return model.encode([text])[0]
+    return embedder.embed(text)
+
+def get_embeddings(texts):
+    """
+    Embeds a list of texts, sharing batches with any concurrent callers.
+    Returns a (len(texts), dimension) float32 matrix.
+    """
+    return embedder.embed_many(texts)
+
+def text_hash(text):
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+def normalize(vectors):
+    """
+    Returns an L2-normalized float32 copy of a vector or a matrix of row vectors.
+    """
+    vectors = np.array(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+@lru_cache(maxsize=1024)
+def get_cached_embedding(text):
+    """
+    Normalized embedding memoized by text, for texts that are re-scored often
+    (e.g. a candidate's resume on every dashboard load).
+    """
+    vector = normalize(get_embedding(text))
+    vector.setflags(write=False)
+    return vector
+
+def candidate_vectors(candidates):
+    """
+    Normalized vectors for a list of candidates, row-aligned with the list.
+    Uses the vectors stored at upload time and embeds (in one batch) only
+    candidates the store doesn't have.
+    """
+    matrix = np.zeros((len(candidates), dimension), dtype=np.float32)
+    missing = []
+    for row, candidate in enumerate(candidates):
+        vector = vector_store.get_vector(candidate.id)
+        if vector is None:
+            missing.append(row)
+        else:
+            matrix[row] = vector
+
+    if missing:
+        matrix[missing] = normalize(get_embeddings([candidates[row].raw_text or "" for row in missing]))
+    return matrix
 
 class VectorStore:
-    def __init__(self):
-        self.index = faiss.IndexFlatL2(dimension)
-        self.id_map = {} # Maps FAISS index id to MySQL Candidate ID
-        
-        if os.path.exists(index_file):
-            self.index = faiss.read_index(index_file)
-        
+    """
+    Candidate vectors in an ID-addressed FAISS index: the FAISS id *is* the
+    MySQL Candidate ID, so re-uploads replace the previous vector instead of
+    appending a duplicate. Vectors are L2-normalized and searched by inner
+    product, so scores are cosine similarities (higher is better).
+
+    The index starts as an exact flat index and is rebuilt in the background
+    as an approximate (IVF / HNSW) and/or compressed index once the corpus
+    outgrows it; see vector_index for the tiers and codecs.
+
+    With VECTOR_INDEX_MMAP the snapshot is mapped read-only. Mutations then go
+    to a small in-memory delta index, and the snapshot copies they replace are
+    masked out of search results until the next compaction folds them in.
+
+    Safe to share between threads: searches run concurrently under a read
+    lock, mutations take the write lock, and the log is written to disk by a
+    background flusher rather than by the request thread. Not safe to share
+    between processes: the snapshot and log have a single writer, and a second
+    process opening them gets VectorLogLocked.
+    """
+    def __init__(self, index_path=index_file, log_path=vector_log_file, id_key="candidate_id"):
+        self.index_path = index_path
+        self.id_key = id_key # Name of the id field in search results
+        self.index = self._new_index()
+        self.log = VectorLog(log_path, dimension)
+        self._rwlock = ReadWriteLock() # Searches share it; mutations, swaps and log rotation are exclusive
+        self._compaction_lock = threading.Lock()
+        self._pending = None # Mutations made while a new tier is being built, or None
+        self._mapped = False # True while self.index is a read-only memory-mapped snapshot
+        self.delta = None
+        self.masked = set()
+
+        if os.path.exists(index_path):
+            loaded = faiss.read_index(index_path)
+            if isinstance(loaded, faiss.IndexIDMap2) or faiss.try_extract_index_ivf(loaded) is not None:
+                if vector_index.VECTOR_INDEX_MMAP:
+                    del loaded
+                    self._open_mapped()
+                else:
+                    self.index = vector_index.configure(loaded)
+            else:
+                self._migrate_legacy(loaded)
+                if vector_index.VECTOR_INDEX_MMAP:
+                    self._open_mapped()
+        self._update_layout()
+
+        self._recover()
+        self.log.open()
+        self._maybe_promote()
+
+    def _update_layout(self):
+        self.tier = vector_index.tier_of(self.index)
+        self.codec = vector_index.codec_of(self.index)
+
+    def _open_mapped(self):
+        self.index = vector_index.read_index(self.index_path, mmap=True)
+        self.delta = self._new_index()
+        self.masked = set()
+        self._mapped = True
+
+    def _recover(self):
+        # Bring the snapshot up to date with every mutation logged after it was taken.
+        # Upserts/deletes are idempotent, so records already in the snapshot are harmless.
+        replayed = 0
+        for op, candidate_id, vector in self.log.replay():
+            ids = np.array([candidate_id], dtype=np.int64)
+            if op == OP_UPSERT:
+                self._apply_upserts(ids, vector.reshape(1, dimension))
+            elif op == OP_DELETE:
+                self._apply_deletes(ids)
+            replayed += 1
+        if replayed:
+            print(f"Replayed {replayed} vector log records on top of {self.index_path}")
+
+    def _new_index(self):
+        return vector_index.build_index("flat", dimension)
+
+    def _migrate_legacy(self, legacy_index):
+        # Old layout: sequential FAISS positions + id_map.pkl (position -> Candidate ID),
+        # possibly with several stale copies per candidate. Keep only the newest one.
+        id_map = {}
         if os.path.exists(id_map_file):
             with open(id_map_file, "rb") as f:
-                self.id_map = pickle.load(f)
+                id_map = pickle.load(f)
+
+        latest = {}
+        for position, candidate_id in sorted(id_map.items()):
+            if position < legacy_index.ntotal:
+                latest[candidate_id] = position
+
+        if latest:
+            vectors = legacy_index.reconstruct_n(0, legacy_index.ntotal)
+            candidate_ids = list(latest.keys())
+            self._apply_upserts(np.array(candidate_ids, dtype=np.int64), normalize(vectors[[latest[c] for c in candidate_ids]]))
+        print(f"Migrated legacy FAISS index: {legacy_index.ntotal} vectors -> {self.index.ntotal} candidates")
+        self._write_snapshot(self.index)
+
+    def __len__(self):
+        with self._rwlock.read():
+            if self._mapped:
+                return self.index.ntotal - len(self.masked) + self.delta.ntotal
+            return self.index.ntotal
+
+    def ids(self):
+        """
+        Set of every ID in the store. Copies the whole index: for occasional checks, not requests.
+        """
+        with self._rwlock.read():
+            ids, _ = self._export()
+        return set(ids.tolist())
+
+    def __contains__(self, candidate_id):
+        return self.get_vector(candidate_id) is not None
+
+    def upsert(self, candidate_id, text):
+        """
+        Embeds `text` and stores it as the only vector for `candidate_id`.
+        """
+        self.upsert_vectors([candidate_id], get_embedding(text).reshape(1, -1))
 
     def add_candidate(self, text, candidate_id):
-        embedding = get_embedding(text)
-        faiss.normalize_L2(embedding.reshape(1, -1)) # Normalize for cosine similarity (optional but good practice)
-        self.index.add(np.array([embedding], dtype=np.float32))
-        
-        # Determine internal FAISS ID (it's sequential)
-        faiss_id = self.index.ntotal - 1
-        self.id_map[faiss_id] = candidate_id
-        
-        self.save()
+        # Kept for existing callers; re-adding a candidate now replaces its vector
+        self.upsert(candidate_id, text)
+
+    def upsert_vectors(self, candidate_ids, vectors):
+        ids = np.array(candidate_ids, dtype=np.int64)
+        vectors = normalize(vectors).reshape(len(ids), dimension)
+        with self._rwlock.write():
+            self._apply_upserts(ids, vectors)
+            self.log.append_upserts(ids, vectors)
+            if self._pending is not None:
+                self._pending.append((OP_UPSERT, ids, vectors))
+        self._maybe_promote()
+
+    def delete(self, candidate_id):
+        ids = np.array([candidate_id], dtype=np.int64)
+        with self._rwlock.write():
+            removed = self._apply_deletes(ids)
+            if removed:
+                self.log.append_deletes(ids)
+                if self._pending is not None:
+                    self._pending.append((OP_DELETE, ids, None))
+        return removed > 0
+
+    def _apply_upserts(self, ids, vectors, index=None):
+        if index is None and self._mapped:
+            # The mapped snapshot can't be modified: shadow it with the delta
+            self._mask(ids)
+            index = self.delta
+        index = self.index if index is None else index
+        index.remove_ids(ids)
+        index.add_with_ids(vectors, ids)
+
+    def _apply_deletes(self, ids, index=None):
+        if index is None and self._mapped:
+            return self._mask(ids) + self.delta.remove_ids(ids)
+        index = self.index if index is None else index
+        return index.remove_ids(ids)
+
+    def _mask(self, ids):
+        # Hides snapshot copies of `ids`; returns how many were newly hidden
+        newly_masked = 0
+        for candidate_id in ids.tolist():
+            if candidate_id not in self.masked and self._reconstruct(self.index, candidate_id) is not None:
+                self.masked.add(candidate_id)
+                newly_masked += 1
+        return newly_masked
+
+    def _export(self):
+        # Everything currently visible, snapshot and delta combined
+        ids, vectors = vector_index.export_vectors(self.index)
+        if not self._mapped:
+            return ids, vectors
+
+        keep = ~np.isin(ids, np.fromiter(self.masked, dtype=np.int64, count=len(self.masked)))
+        delta_ids, delta_vectors = vector_index.export_vectors(self.delta)
+        return np.concatenate([ids[keep], delta_ids]), np.concatenate([vectors[keep], delta_vectors])
+
+    def _maybe_promote(self):
+        ntotal = len(self)
+        tier = vector_index.target_tier(ntotal)
+        codec = vector_index.target_codec(ntotal)
+        # Only ever promote: a few deletes near a threshold shouldn't trigger rebuilds
+        if tier == "flat":
+            tier = self.tier
+        if codec == "flat":
+            codec = self.codec
+        if (tier, codec) == (self.tier, self.codec) or self._pending is not None:
+            return
+
+        with self._rwlock.write():
+            if self._pending is not None:
+                return
+            ids, vectors = self._export()
+            self._pending = []
+
+        print(f"Rebuilding vector index: {self.tier}/{self.codec} -> {tier}/{codec} ({len(ids)} vectors)")
+        threading.Thread(target=self._rebuild, args=(tier, codec, ids, vectors), name="vector-rebuild", daemon=True).start()
+
+    def _rebuild(self, tier, codec, ids, vectors):
+        # Train and fill the new index off the request path, then swap it in
+        # atomically after replaying whatever changed in the meantime.
+        started = time.monotonic()
+        try:
+            new_index = vector_index.build_index(tier, dimension, ids, vectors, codec=codec)
+        except Exception as e:
+            print(f"Error building {tier}/{codec} vector index: {e}")
+            with self._rwlock.write():
+                self._pending = None
+            return
+
+        with self._rwlock.write():
+            for op, op_ids, op_vectors in self._pending:
+                if op == OP_UPSERT:
+                    self._apply_upserts(op_ids, op_vectors, new_index)
+                else:
+                    new_index.remove_ids(op_ids)
+            # Fully in memory until the snapshot below is written (and re-mapped)
+            self.index = new_index
+            self.delta = None
+            self.masked = set()
+            self._mapped = False
+            self._update_layout()
+            self._pending = None
+
+        print(f"Vector index is now {tier}/{codec} ({new_index.ntotal} vectors, built in {time.monotonic() - started:.1f}s)")
+        self.save(force=True)
+
+    def get_vector(self, candidate_id):
+        """
+        Returns the stored normalized vector for a candidate, or None.
+        Decoded from the codec, so approximate unless the codec is flat.
+        """
+        candidate_id = int(candidate_id)
+        with self._rwlock.read():
+            if self._mapped:
+                vector = self._reconstruct(self.delta, candidate_id)
+                if vector is not None or candidate_id in self.masked:
+                    return vector
+            return self._reconstruct(self.index, candidate_id)
+
+    def _reconstruct(self, index, candidate_id):
+        try:
+            return index.reconstruct(candidate_id)
+        except RuntimeError:
+            return None
 
     def search(self, query_text, k=5):
-        query_embedding = get_embedding(query_text)
-        # faiss.normalize_L2(query_embedding.reshape(1, -1)) # If index vectors are normalized
-        D, I = self.index.search(np.array([query_embedding], dtype=np.float32), k)
-        
-        results = []
-        for i, idx in enumerate(I[0]):
-            if idx != -1 and idx in self.id_map:
-                results.append({
-                    "candidate_id": self.id_map[idx],
-                    "score": float(D[0][i]) # L2 distance, lower is better. For cosine need inner product index.
-                })
-        return results
-
-    def save(self):
-        faiss.write_index(self.index, index_file)
-        with open(id_map_file, "wb") as f:
-            pickle.dump(self.id_map, f)
+        return self.search_vector(get_embedding(query_text), k)
+
+    def search_vector(self, query_vector, k=5):
+        # Query is normalized exactly like the stored vectors
+        query = normalize(query_vector).reshape(1, dimension)
+
+        with self._rwlock.read(), metrics.VECTOR_SEARCH_SECONDS.time(store=self.id_key):
+            if not self._mapped:
+                hits = self._search(self.index, query, k)
+            else:
+                # Over-fetch from the snapshot so masked (stale) hits can be dropped
+                hits = [hit for hit in self._search(self.index, query, k + len(self.masked)) if hit[1] not in self.masked]
+                hits = sorted(hits + self._search(self.delta, query, k), reverse=True)[:k]
+
+        return [
+            {
+                self.id_key: candidate_id,
+                "score": score # Cosine similarity, higher is better
+            }
+            for score, candidate_id in hits
+        ]
+
+    def close(self):
+        """
+        Writes out the log and stops its flusher, for process shutdown. Waits for
+        a compaction in progress; the store can't be changed afterwards.
+        """
+        with self._compaction_lock, self._rwlock.write():
+            self.log.close()
+
+    def _search(self, index, query, k):
+        k = min(k, index.ntotal)
+        if k <= 0:
+            return []
+        D, I = index.search(query, k)
+        return [(float(score), int(candidate_id)) for score, candidate_id in zip(D[0], I[0]) if candidate_id != -1]
+
+    def save(self, force=False):
+        """
+        Compacts the log into a new snapshot. Writers are only blocked while
+        the index is cloned, not while the snapshot is written to disk.
+        """
+        with self._compaction_lock:
+            if self._mapped:
+                # A mapped index can't be cloned; load a private writable copy of the same snapshot
+                snapshot = vector_index.read_index(self.index_path, mmap=False)
+
+            with self._rwlock.write():
+                if self.log.records == 0 and not force:
+                    return
+                if self._mapped:
+                    snapshot.remove_ids(np.fromiter(self.masked, dtype=np.int64, count=len(self.masked)))
+                    delta_ids, delta_vectors = vector_index.export_vectors(self.delta)
+                    self._apply_upserts(delta_ids, delta_vectors, snapshot)
+                else:
+                    snapshot = faiss.clone_index(self.index)
+                rotated = self.log.rotate()
+
+            self._write_snapshot(snapshot)
+            rotated.wait()
+            self.log.discard_rotated()
+            del snapshot
+
+            if vector_index.VECTOR_INDEX_MMAP:
+                with self._rwlock.write():
+                    # Re-map the new snapshot; only mutations logged since the rotation belong in the delta,
+                    # so make sure they have all reached the log file before replaying it
+                    self.log.flush()
+                    self._open_mapped()
+                    self._recover()
+
+    def _write_snapshot(self, index):
+        # Write-then-rename so a crash never leaves a half-written snapshot behind.
+        # Processes still mapping the old file keep their (now unlinked) copy.
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        faiss.write_index(index, tmp_path)
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.index_path)
+
+    def start_compaction(self, interval=VECTOR_COMPACT_INTERVAL, min_records=VECTOR_COMPACT_MIN_RECORDS):
+        """
+        Starts the background compaction thread. Set the returned Event to stop it.
+        """
+        stop = threading.Event()
+
+        def run():
+            last_compaction = time.monotonic()
+            while not stop.wait(interval) and not self.log.closed:
+                idle_for = time.monotonic() - last_compaction
+                # Compact when the log is big, or when anything at all has been waiting a long time
+                if self.log.records >= min_records or (self.log.records and idle_for >= interval * 10):
+                    try:
+                        self.save()
+                        last_compaction = time.monotonic()
+                    except Exception as e:
+                        print(f"Error compacting vector store: {e}")
+
+        threading.Thread(target=run, name="vector-compaction", daemon=True).start()
+        return stop
 
 vector_store = VectorStore()
+# Set to stop background compaction (bulk_import does, to save the index once at the end)
+stop_vector_compaction = vector_store.start_compaction()
+
+# Second index over job descriptions (FAISS id = Job ID), kept in sync by job_embeddings
+job_store = VectorStore(job_index_file, job_vector_log_file, id_key="job_id")
+job_store.start_compaction()
+
+def close_stores():
+    """
+    Flushes and closes both stores' logs. Runs at interpreter exit; the server's
+    shutdown and bulk_import call it earlier. Calling it again does nothing.
+    """
+    for store in (vector_store, job_store):
+        try:
+            store.close()
+        except Exception as e:
+            print(f"Error closing vector log {store.log.path}: {e}")
+
+atexit.register(close_stores)
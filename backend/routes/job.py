@@ -1,23 +1,35 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, BackgroundTasks
 from sqlalchemy.orm import Session
 from database import get_db
 from models import Job, User
-from schemas import JobCreate, JobResponse
+from schemas import JobCreate, JobResponse, JobRecommendationPage
 from auth import get_current_recruiter
+from job_embeddings import job_embedding_cache
+import compaction
+import quiz_generation
 
 router = APIRouter()
 
 @router.post("/create-job", response_model=JobResponse)
-def create_job(job: JobCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_recruiter)):
+def create_job(job: JobCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db), current_user: User = Depends(get_current_recruiter)):
     new_job = Job(
         title=job.title,
         description=job.description,
         requirements=job.requirements,
         recruiter_id=current_user.id
     )
+    # Compact the description once here; every prompt about this job reuses it
+    new_job.compact_description, new_job.compact_tokens = compaction.compact_job(job.description)
     db.add(new_job)
     db.commit()
     db.refresh(new_job)
+
+    # Embed the description once here so candidate views never re-embed it
+    job_embedding_cache.store(db, new_job)
+
+    # Have the quiz ready before the first candidate opens it
+    if quiz_generation.QUIZ_PREGENERATE:
+        background_tasks.add_task(quiz_generation.pregenerate, new_job.id, new_job.compact_description)
     return new_job
 
 @router.get("/jobs", response_model=list[JobResponse])
@@ -29,12 +41,19 @@ def get_jobs(db: Session = Depends(get_db), current_user: User = Depends(get_cur
     # We should probably have a separate endpoint or make auth optional/generic.
     return db.query(Job).all()
 
-from auth import get_current_user_optional
+from auth import get_current_user_optional, get_current_candidate
 from models import Candidate, Application
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
+from fastapi import HTTPException, Query
+from typing import Optional
+import base64
+import json
+import os
 import rag
 
+# Recommendations are paged through the top RECOMMENDATION_MAX_RESULTS jobs only: each
+# page is a top-k search, so the deeper the page, the larger the k
+RECOMMENDATION_MAX_RESULTS = int(os.getenv("RECOMMENDATION_MAX_RESULTS", "500"))
+
 @router.get("/jobs/candidate-view", response_model=list[JobResponse])
 def get_jobs_candidate(db: Session = Depends(get_db), current_user: User = Depends(get_current_user_optional)):
     jobs = db.query(Job).all()
@@ -46,25 +65,99 @@ def get_jobs_candidate(db: Session = Depends(get_db), current_user: User = Depen
     if not candidate or not candidate.raw_text:
         return jobs
         
-    # Calculate simple embeddings match
-    candidate_embedding = rag.get_embedding(candidate.raw_text).reshape(1, -1)
-    
+    # Calculate simple embeddings match: one matrix-vector product over all jobs
+    # Reuse the vector stored at upload time; only embed if the store doesn't have it
+    candidate_embedding = rag.vector_store.get_vector(candidate.id)
+    if candidate_embedding is None:
+        candidate_embedding = rag.get_cached_embedding(candidate.raw_text)
+    job_matrix = job_embedding_cache.matrix(db, jobs)
+    similarities = job_matrix @ candidate_embedding
+
+    # Resolve applications in one query instead of one per job
+    applied_job_ids = {
+        job_id for (job_id,) in db.query(Application.job_id).filter(Application.candidate_id == candidate.id)
+    }
+
     job_responses = []
-    for job in jobs:
-        # Check if applied
-        has_applied = db.query(Application).filter(
-            Application.job_id == job.id, 
-            Application.candidate_id == candidate.id
-        ).first() is not None
-        
-        # Calculate Score
-        job_embedding = rag.get_embedding(job.description).reshape(1, -1)
-        similarity = cosine_similarity(candidate_embedding, job_embedding)[0][0]
+    for job, similarity in zip(jobs, similarities):
         match_score = float(similarity) * 100 # percentage
-        
+
         job_resp = JobResponse.from_orm(job)
-        job_resp.has_applied = has_applied
+        job_resp.has_applied = job.id in applied_job_ids
         job_resp.match_score = round(match_score, 1)
         job_responses.append(job_resp)
         
     return job_responses
+
+def _rank(hit):
+    # Recommendation order: best score first, ties by job ID
+    return (-hit["score"], hit["job_id"])
+
+def encode_cursor(last_hit, served):
+    # The last job served and how many have been served so far
+    state = {"score": last_hit["score"], "job_id": last_hit["job_id"], "served": served}
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return {"score": float(state["score"]), "job_id": int(state["job_id"])}, int(state["served"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/jobs/recommendations", response_model=JobRecommendationPage)
+def get_job_recommendations(limit: int = Query(20, ge=1, le=100), cursor: Optional[str] = None, db: Session = Depends(get_db), current_user: User = Depends(get_current_candidate)):
+    candidate = db.query(Candidate).filter(Candidate.user_id == current_user.id).first()
+    if not candidate or not candidate.raw_text:
+        return JobRecommendationPage(jobs=[])
+
+    last_hit, served = decode_cursor(cursor) if cursor else (None, 0)
+    limit = min(limit, RECOMMENDATION_MAX_RESULTS - served)
+    if limit <= 0:
+        return JobRecommendationPage(jobs=[])
+
+    candidate_embedding = rag.vector_store.get_vector(candidate.id)
+    if candidate_embedding is None:
+        candidate_embedding = rag.get_cached_embedding(candidate.raw_text)
+
+    # Top-k search over the job index: cost depends on the page depth (capped), not on how many
+    # jobs exist. The page starts after the last job served, so jobs added or removed between pages
+    # don't shift it. k grows only when new jobs ranked above the cursor, or a run of equal scores,
+    # crowd the page out. One extra hit tells us whether there is a next page.
+    job_embedding_cache.sync_index(db)
+    k = served + limit + 1
+    while True:
+        hits = sorted(rag.job_store.search_vector(candidate_embedding, k=k), key=_rank)
+        exhausted = len(hits) < k
+        if not exhausted:
+            # The search may have cut the jobs tied with the k-th score short; only those above it are final
+            hits = [hit for hit in hits if hit["score"] > hits[-1]["score"]]
+        if last_hit is not None:
+            hits = [hit for hit in hits if _rank(hit) > _rank(last_hit)]
+        if len(hits) > limit or exhausted:
+            break
+        k *= 2
+    page = hits[:limit]
+
+    page_ids = [hit["job_id"] for hit in page]
+    jobs = {job.id: job for job in db.query(Job).filter(Job.id.in_(page_ids)).all()}
+    applied_job_ids = {
+        job_id for (job_id,) in db.query(Application.job_id).filter(
+            Application.candidate_id == candidate.id,
+            Application.job_id.in_(page_ids)
+        )
+    }
+
+    job_responses = []
+    for hit in page:
+        job = jobs.get(hit["job_id"])
+        if not job:
+            continue
+        job_resp = JobResponse.from_orm(job)
+        job_resp.has_applied = job.id in applied_job_ids
+        job_resp.match_score = round(hit["score"] * 100, 1)
+        job_responses.append(job_resp)
+
+    has_more = len(hits) > limit and served + limit < RECOMMENDATION_MAX_RESULTS
+    next_cursor = encode_cursor(page[-1], served + limit) if has_more else None
+    return JobRecommendationPage(jobs=job_responses, next_cursor=next_cursor)
@@ -1,64 +1,270 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional
 from sqlalchemy.orm import Session
+from sqlalchemy import func
 from database import get_db
 from models import Job, Candidate, MatchResult, FinalRanking
 from schemas import MatchRequest
 import rag
 import llm
+import compaction
+import skill_scorer
 
 router = APIRouter()
 
 from auth import get_current_recruiter
 from models import Job, Candidate, MatchResult, FinalRanking, User
+from job_embeddings import job_embedding_cache
+from typing import Optional
+import numpy as np
+import os
 
-@router.post("/match/{job_id}")
-def match_candidates(job_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_recruiter)):
+# Shortlist pre-filter: only the applicants most similar to the job (by embedding)
+# go to the LLM; the rest get a fast embedding-based score.
+# MATCH_SHORTLIST_K = 0 sends everyone; MATCH_SHORTLIST_MIN_SIMILARITY is a cosine similarity (-1..1).
+MATCH_SHORTLIST_K = int(os.getenv("MATCH_SHORTLIST_K", "25"))
+MATCH_SHORTLIST_MIN_SIMILARITY = float(os.getenv("MATCH_SHORTLIST_MIN_SIMILARITY", "-1"))
+
+def shortlist(similarities, k, min_similarity):
+    """
+    Returns the set of row indices that should be scored by the LLM:
+    the top-k rows (all if k <= 0) whose similarity is at least min_similarity.
+    """
+    order = np.argsort(-similarities)
+    if k > 0:
+        order = order[:k]
+    return {int(row) for row in order if similarities[row] >= min_similarity}
+
+def store_skill_scores(db, job, candidates, existing_results):
+    """
+    Fast tier: deterministic skill-overlap / experience-fit scores for all applicants
+    in one vectorised pass, no LLM calls. LLM results already stored are kept.
+    """
+    scored = 0
+    for candidate, explanation in zip(candidates, skill_scorer.explain_many(job, candidates)):
+        existing_result = existing_results.get(candidate.id)
+        if existing_result and existing_result.score_source == "llm":
+            continue
+        values = dict(
+            skill_match_percentage=explanation["skill_match_percentage"],
+            experience_match_percentage=explanation["experience_match_percentage"],
+            overall_match_score=explanation["overall_match_score"],
+            reasoning=skill_scorer.reasoning(explanation),
+            score_source="skills",
+            model=None,
+            model_tier=None,
+            latency_ms=None
+        )
+        if existing_result:
+            for key, value in values.items():
+                setattr(existing_result, key, value)
+        else:
+            db.add(MatchResult(job_id=job.id, candidate_id=candidate.id, **values))
+        scored += 1
+    db.commit()
+    return scored
+
+def load_applicants(db, job_id):
     job = db.query(Job).filter(Job.id == job_id).first()
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-
-    # 1. Fetch Applicants ONLY
     from models import Application
-    applications = db.query(Application).filter(Application.job_id == job_id).all()
-    
-    matched_candidates = []
-    
-    for app in applications:
-        candidate_id = app.candidate_id
-        candidate = db.query(Candidate).filter(Candidate.id == candidate_id).first()
-        if not candidate:
+    candidates = db.query(Candidate).join(Application, Application.candidate_id == Candidate.id).filter(Application.job_id == job_id).all()
+    existing_results = {r.candidate_id: r for r in db.query(MatchResult).filter(MatchResult.job_id == job_id).all()}
+    return job, candidates, existing_results
+
+def plan_llm_scoring(db, job, candidates, existing_results, shortlist_k, min_similarity):
+    """
+    Ranks applicants by embedding similarity to the job and works out which need scoring.
+    Returns (similarities, shortlisted rows, pending (row, candidate) pairs, job prompt text,
+    (candidate id, prompt text) for the shortlisted pending ones).
+    """
+    # Job embedded once, cached
+    job_vector = job_embedding_cache.matrix(db, [job])[0]
+    similarities = rag.candidate_vectors(candidates) @ job_vector if candidates else np.zeros(0)
+    shortlisted = shortlist(similarities, shortlist_k, min_similarity)
+
+    # LLM results (usually computed at application time) are kept as-is.
+    # Embedding-only and skill-overlap results are upgraded once the candidate makes the shortlist.
+    pending = []
+    for row, candidate in enumerate(candidates):
+        existing_result = existing_results.get(candidate.id)
+        if existing_result and (existing_result.score_source == "llm" or row not in shortlisted):
             continue
-            
-        # 2. Check for existing Match Result (Computed at application time usually)
-        # If not present, compute it now.
-        existing_result = db.query(MatchResult).filter(MatchResult.job_id == job_id, MatchResult.candidate_id == candidate_id).first()
-        
-        match_data = {}
-        if existing_result:
-             match_data = {
-                 "candidate_id": candidate_id,
-                 "candidate_name": candidate.name,
-                 "overall_match_score": existing_result.overall_match_score,
-                 "reasoning": existing_result.reasoning
-             }
-        else:
-             # Fallback if matching wasn't done at apply time
-             match_data = llm.match_candidate(candidate.raw_text, job.description)
-             
-             match_result = MatchResult(
-                job_id=job_id,
-                candidate_id=candidate_id,
+        pending.append((row, candidate))
+    to_llm = [(candidate.id, compaction.candidate_prompt_text(candidate)) for row, candidate in pending if row in shortlisted]
+    return similarities, shortlisted, pending, compaction.job_prompt_text(job), to_llm
+
+def store_match_results(db, job_id, pending, shortlisted, similarities, llm_results, existing_results):
+    """
+    Writes every pending result in one batch: the LLM's where it has one, otherwise an
+    embedding score. Returns (llm_scored, embedding_scored).
+    """
+    llm_scored = 0
+    embedding_scored = 0
+    for row, candidate in pending:
+        if candidate.id in llm_results:
+            match_data = llm_results[candidate.id]
+            values = dict(
                 skill_match_percentage=match_data.get("skill_match_percentage", 0),
                 experience_match_percentage=match_data.get("experience_match_percentage", 0),
                 overall_match_score=match_data.get("overall_match_score", 0),
-                reasoning=match_data.get("reasoning", "")
-             )
-             db.add(match_result)
-             db.commit()
-        
-        matched_candidates.append(match_data)
+                reasoning=match_data.get("reasoning", ""),
+                score_source="llm",
+                model=match_data.get("model"),
+                model_tier=match_data.get("model_tier"),
+                latency_ms=match_data.get("latency_ms")
+            )
+            llm_scored += 1
+        else:
+            # Candidates the LLM couldn't score (rate limits, outage) keep an embedding score
+            # for now and are picked up again by the next run instead of getting a bogus 0
+            similarity = float(similarities[row])
+            why = "LLM scoring failed, will retry on the next run" if row in shortlisted else "not shortlisted for LLM review"
+            values = dict(
+                skill_match_percentage=None,
+                experience_match_percentage=None,
+                overall_match_score=round(max(similarity, 0.0) * 100, 1),
+                reasoning=f"Embedding similarity only ({similarity:.2f}); {why}",
+                score_source="embedding",
+                model=None,
+                model_tier=None,
+                latency_ms=None
+            )
+            embedding_scored += 1
+
+        existing_result = existing_results.get(candidate.id)
+        if existing_result:
+            for key, value in values.items():
+                setattr(existing_result, key, value)
+        else:
+            db.add(MatchResult(job_id=job_id, candidate_id=candidate.id, **values))
+
+    db.commit()
+    return llm_scored, embedding_scored
+
+@router.post("/match/{job_id}")
+async def match_candidates(job_id: int, mode: str = "llm", shortlist_k: Optional[int] = None, min_similarity: Optional[float] = None, db: Session = Depends(get_db), current_user: User = Depends(get_current_recruiter)):
+    """
+    mode=llm (default): embedding shortlist scored by the LLM, the rest by embedding similarity.
+    mode=fast: deterministic skill-overlap scores for everyone, instantly; use
+    /match/{job_id}/explain/{candidate_id} for LLM reasoning on a specific candidate.
+
+    Only the LLM calls run on the event loop; database work, embeddings and scoring
+    block, so they run in the threadpool.
+    """
+    if mode not in ("llm", "fast"):
+        raise HTTPException(status_code=400, detail="mode must be 'llm' or 'fast'")
+    shortlist_k = MATCH_SHORTLIST_K if shortlist_k is None else shortlist_k
+    min_similarity = MATCH_SHORTLIST_MIN_SIMILARITY if min_similarity is None else min_similarity
+
+    # 1. Fetch Applicants ONLY
+    job, candidates, existing_results = await run_in_threadpool(load_applicants, db, job_id)
+
+    if mode == "fast":
+        return {
+            "status": "matched",
+            "candidates_processed": len(candidates),
+            "skills_scored": await run_in_threadpool(store_skill_scores, db, job, candidates, existing_results)
+        }
+
+    # 2. Rank applicants by embedding similarity and work out which need scoring
+    similarities, shortlisted, pending, job_text, to_llm = await run_in_threadpool(
+        plan_llm_scoring, db, job, candidates, existing_results, shortlist_k, min_similarity
+    )
+
+    # 3. Score the shortlisted ones with the LLM: MATCH_BATCH_SIZE resumes per completion,
+    # LLM_MAX_CONCURRENCY completions in flight
+    # Re-matching is bulk work: it goes to LLM_BULK_PROVIDER (e.g. a local model) when one is configured
+    with llm.use_workload("bulk"):
+        llm_results = await llm.match_batches_concurrently(job_text, to_llm)
+    llm_failed = len(to_llm) - sum(1 for candidate_id, _ in to_llm if candidate_id in llm_results)
+
+    # 4. Write every result in one batch
+    llm_scored, embedding_scored = await run_in_threadpool(
+        store_match_results, db, job_id, pending, shortlisted, similarities, llm_results, existing_results
+    )
+
+    return {
+        "status": "matched",
+        "candidates_processed": len(candidates),
+        "llm_scored": llm_scored,
+        "embedding_scored": embedding_scored,
+        "llm_failed": llm_failed
+    }
+
+@router.get("/match/cascade-report")
+def cascade_report(job_id: Optional[int] = None, db: Session = Depends(get_db), current_user: User = Depends(get_current_recruiter)):
+    """
+    How the model cascade is doing: share of LLM scores escalated to the larger model,
+    and LLM time saved compared with sending every candidate to the larger model.
+    """
+    query = db.query(
+        MatchResult.model_tier, func.count(MatchResult.id), func.avg(MatchResult.latency_ms), func.sum(MatchResult.latency_ms)
+    ).filter(MatchResult.score_source == "llm", MatchResult.model_tier.isnot(None))
+    if job_id is not None:
+        query = query.filter(MatchResult.job_id == job_id)
+    tiers = {tier: (count, avg or 0.0, total or 0.0) for tier, count, avg, total in query.group_by(MatchResult.model_tier).all()}
+
+    base_count, base_avg, base_total = tiers.get("base", (0, 0.0, 0.0))
+    escalated_count, escalated_avg, escalated_total = tiers.get("escalated", (0, 0.0, 0.0))
+    scored = base_count + escalated_count
+
+    # An escalated score paid for the base call plus the larger model, so the larger
+    # model alone costs about the difference of the two averages
+    large_model_ms = escalated_avg - base_avg if escalated_count and base_count else None
+    latency_saved_ms = None
+    if large_model_ms is not None:
+        latency_saved_ms = round(scored * large_model_ms - (base_total + escalated_total), 1)
+
+    return {
+        "job_id": job_id,
+        "cascade_enabled": llm.MATCH_CASCADE,
+        "base_model": llm.MATCH_MODEL,
+        "escalation_model": llm.MATCH_ESCALATION_MODEL,
+        "borderline_band": [llm.MATCH_BORDERLINE_LOW, llm.MATCH_BORDERLINE_HIGH],
+        "llm_scored": scored,
+        "escalated": escalated_count,
+        "escalation_rate": round(escalated_count / scored, 4) if scored else 0.0,
+        "avg_base_latency_ms": round(base_avg, 1),
+        "avg_escalated_latency_ms": round(escalated_avg, 1),
+        "est_large_model_latency_ms": None if large_model_ms is None else round(large_model_ms, 1),
+        "latency_saved_ms": latency_saved_ms
+    }
+
+@router.post("/match/{job_id}/explain/{candidate_id}")
+def explain_match(job_id: int, candidate_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_recruiter)):
+    """
+    On-demand LLM reasoning for one applicant, next to the deterministic skill breakdown.
+    The LLM result replaces any fast-tier or embedding score for the pair.
+    """
+    job = db.query(Job).filter(Job.id == job_id).first()
+    candidate = db.query(Candidate).filter(Candidate.id == candidate_id).first()
+    if not job or not candidate:
+        raise HTTPException(status_code=404, detail="Job or Candidate not found")
+
+    breakdown = skill_scorer.explain(job, candidate)
+    try:
+        match_data = llm.match_candidate(compaction.candidate_prompt_text(candidate), compaction.job_prompt_text(job))
+    except llm.LLMError as e:
+        raise HTTPException(status_code=503, detail=f"LLM unavailable: {e}")
+
+    result = db.query(MatchResult).filter(MatchResult.job_id == job_id, MatchResult.candidate_id == candidate_id).first()
+    if not result:
+        result = MatchResult(job_id=job_id, candidate_id=candidate_id)
+        db.add(result)
+    result.skill_match_percentage = match_data["skill_match_percentage"]
+    result.experience_match_percentage = match_data["experience_match_percentage"]
+    result.overall_match_score = match_data["overall_match_score"]
+    result.reasoning = match_data["reasoning"]
+    result.score_source = "llm"
+    result.model = match_data["model"]
+    result.model_tier = match_data["model_tier"]
+    result.latency_ms = match_data["latency_ms"]
+    db.commit()
 
-    return {"status": "matched", "candidates_processed": len(matched_candidates)}
+    return {"skills": breakdown, "llm": match_data}
 
 @router.post("/notify-candidate/{job_id}/{candidate_id}")
 def notify_candidate(job_id: int, candidate_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_recruiter)):
@@ -1,10 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from database import get_db
 from models import Job, Quiz, QuizResult, FinalRanking, MatchResult, User
 from schemas import QuizCreate, QuizSubmit
 from auth import get_current_recruiter, get_current_user
 import llm
+import compaction
+import quiz_generation
 import quiz as quiz_logic
 import scoring
 
@@ -16,7 +20,7 @@ def generate_quiz(job_id: int, db: Session = Depends(get_db), current_user: User
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
         
-    questions = llm.generate_quiz_questions(job.description)
+    questions = llm.generate_quiz_questions(compaction.job_prompt_text(job))
     
     new_quiz = Quiz(job_id=job_id, questions=questions)
     db.add(new_quiz)
@@ -24,68 +28,65 @@ def generate_quiz(job_id: int, db: Session = Depends(get_db), current_user: User
     
     return {"status": "quiz_generated", "questions_count": len(questions)}
 
+def load_quiz(db, job_id):
+    """
+    (quiz_id, questions, None) for the job's stored quiz, or (None, None, job_text) to
+    generate one from. Blocking DB work: the async handlers call it through run_in_threadpool.
+    """
+    quiz = quiz_generation.latest_quiz(db, job_id)
+    if quiz:
+        return quiz.id, quiz.questions, None
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job_text = compaction.job_prompt_text(job)
+    db.commit()
+    return None, None, job_text
+
 @router.get("/quiz/{job_id}")
-def get_quiz(job_id: int, db: Session = Depends(get_db)):
-    quiz = db.query(Quiz).filter(Quiz.job_id == job_id).first()
+async def get_quiz(job_id: int, db: Session = Depends(get_db)):
+    quiz_id, questions, job_text = await run_in_threadpool(load_quiz, db, job_id)
     
-    # Auto-generate if not found
-    if not quiz:
-        job = db.query(Job).filter(Job.id == job_id).first()
-        if not job:
-             raise HTTPException(status_code=404, detail="Job not found")
-             
-        try:
-            questions = llm.generate_quiz_questions(job.description)
+    # Auto-generate if not found; concurrent requests wait on the same generation
+    if quiz_id is None:
+        # Falls back to generic questions if the LLM fails
+        return await quiz_generation.start(job_id, job_text).wait()
             
-            # Fallback if LLM fails or returns empty
-            if not questions:
-                print("LLM returned empty questions. Using fallback.")
-                questions = [
-                    {
-                        "question": "What is the primary skill required for this role?",
-                        "options": ["Technical Proficiency", "Communication", "Leadership", "All of the above"],
-                        "correct_answer": "All of the above"
-                    },
-                    {
-                        "question": "Which of the following is most important for a team player?",
-                        "options": ["Working in isolation", "Collaboration", "Ignoring feedback", "micromanagement"],
-                        "correct_answer": "Collaboration"
-                    },
-                    {
-                         "question": "What is the best way to handle a tight deadline?",
-                         "options": ["Panic", "Prioritize tasks", "Give up", "Blame others"],
-                         "correct_answer": "Prioritize tasks"
-                    }
-                ]
-
-            new_quiz = Quiz(job_id=job_id, questions=questions)
-            db.add(new_quiz)
-            db.commit()
-            db.refresh(new_quiz)
-            return new_quiz.questions
-        except Exception as e:
-            print(f"Error generating quiz: {e}")
-            # Even on exception, return fallback instead of 500
-            fallback_questions = [
-                    {
-                        "question": "General Aptitude: What comes next in the sequence? 2, 4, 8, 16...",
-                        "options": ["30", "32", "24", "20"],
-                        "correct_answer": "32"
-                    }
-            ]
-            new_quiz = Quiz(job_id=job_id, questions=fallback_questions)
-            db.add(new_quiz)
-            db.commit()
-            db.refresh(new_quiz)
-            return new_quiz.questions
-            
-    return quiz.questions
+    return questions
 
 import json
 
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _stored_quiz_events(quiz_id, questions):
+    for question in questions:
+        yield _sse("question", question)
+    yield _sse("done", {"quiz_id": quiz_id, "questions_count": len(questions)})
+
+async def _new_quiz_events(generation):
+    # Joins the generation from its first question, whoever started it
+    async for question in generation.follow():
+        yield _sse("question", question)
+    yield _sse("done", {"quiz_id": generation.quiz_id, "questions_count": len(generation.questions)})
+
+@router.get("/quiz/{job_id}/stream")
+async def stream_quiz(job_id: int, db: Session = Depends(get_db)):
+    """
+    Server-Sent Events version of get_quiz: a `question` event per question as soon as it
+    has been generated, then a `done` event once the quiz is stored.
+    """
+    quiz_id, questions, job_text = await run_in_threadpool(load_quiz, db, job_id)
+    if quiz_id is not None:
+        events = _stored_quiz_events(quiz_id, questions)
+    else:
+        events = _new_quiz_events(quiz_generation.start(job_id, job_text))
+    # X-Accel-Buffering: stop nginx from holding events back until the stream ends
+    return StreamingResponse(events, media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @router.post("/submit-quiz")
 def submit_quiz(submission: QuizSubmit, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    quiz_entry = db.query(Quiz).filter(Quiz.job_id == submission.job_id).order_by(Quiz.id.desc()).first()
+    quiz_entry = quiz_generation.latest_quiz(db, submission.job_id)
     if not quiz_entry:
         raise HTTPException(status_code=404, detail="Quiz not found")
         
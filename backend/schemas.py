@@ -1,5 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional, Any
+from datetime import datetime
 
 class UserBase(BaseModel):
     email: EmailStr
@@ -50,6 +51,10 @@ class JobResponse(JobCreate):
     class Config:
         from_attributes = True
 
+class JobRecommendationPage(BaseModel):
+    jobs: List[JobResponse]
+    next_cursor: Optional[str] = None # Pass back as ?cursor= to get the next page
+
 class QuizQuestion(BaseModel):
     question: str
     options: List[str]
@@ -89,3 +94,18 @@ class ApplicationResponse(BaseModel):
 class MatchScoreResponse(BaseModel):
     job_id: int
     score: float
+
+class IngestionJobResponse(BaseModel):
+    id: int
+    kind: str
+    job_id: Optional[int] = None
+    filename: Optional[str] = None
+    status: str # pending, parsing, extracting, embedding, matching, done, failed
+    error: Optional[str] = None
+    reused: Optional[str] = None # 'file' or 'text': the stored resume matched; parsing/LLM extraction were skipped
+    candidate_id: Optional[int] = None
+    application_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    class Config:
+        from_attributes = True
@@ -0,0 +1,235 @@
+import os
+import re
+import threading
+from functools import lru_cache
+import numpy as np
+
+# Deterministic, zero-LLM match score: weighted skill overlap plus experience fit.
+# overall = 100 * (SKILL_SCORE_WEIGHT * skill_overlap + (1 - SKILL_SCORE_WEIGHT) * experience_fit)
+SKILL_SCORE_WEIGHT = float(os.getenv("SKILL_SCORE_WEIGHT", "0.75"))
+# Weight of skills listed after "nice to have" / "preferred" / "bonus" in the requirements
+PREFERRED_SKILL_WEIGHT = float(os.getenv("PREFERRED_SKILL_WEIGHT", "0.5"))
+
+# Alias -> canonical skill name. Keys are compared after lower-casing and whitespace collapsing.
+SKILL_ALIASES = {
+    "js": "javascript", "ecmascript": "javascript", "es6": "javascript",
+    "ts": "typescript",
+    "py": "python", "python3": "python", "python 3": "python",
+    "golang": "go",
+    "c sharp": "c#", "csharp": "c#",
+    "cpp": "c++",
+    "reactjs": "react", "react.js": "react", "react js": "react",
+    "vuejs": "vue", "vue.js": "vue",
+    "angularjs": "angular", "angular.js": "angular",
+    "nodejs": "node.js", "node": "node.js", "node js": "node.js",
+    "nextjs": "next.js", "next": "next.js",
+    "expressjs": "express", "express.js": "express",
+    "postgres": "postgresql", "postgre": "postgresql", "psql": "postgresql",
+    "mongo": "mongodb", "mongo db": "mongodb",
+    "mysql db": "mysql",
+    "ms sql": "sql server", "mssql": "sql server",
+    "k8s": "kubernetes",
+    "aws": "amazon web services", "amazon aws": "amazon web services",
+    "gcp": "google cloud", "google cloud platform": "google cloud",
+    "azure cloud": "azure", "microsoft azure": "azure",
+    "ml": "machine learning",
+    "dl": "deep learning",
+    "ai": "artificial intelligence",
+    "nlp": "natural language processing",
+    "cv": "computer vision",
+    "llm": "large language models", "llms": "large language models",
+    "tf": "tensorflow",
+    "sklearn": "scikit-learn", "scikit learn": "scikit-learn",
+    "rest": "rest api", "restful": "rest api", "rest apis": "rest api", "restful api": "rest api", "restful apis": "rest api",
+    "ci/cd": "ci/cd", "cicd": "ci/cd", "ci cd": "ci/cd",
+    "oop": "object-oriented programming", "object oriented programming": "object-oriented programming",
+    "dsa": "data structures and algorithms", "data structures": "data structures and algorithms",
+    "html5": "html", "css3": "css",
+    "fast api": "fastapi",
+    "spring boot": "spring", "springboot": "spring",
+    "git hub": "github",
+    "powerbi": "power bi",
+    "excel": "microsoft excel", "ms excel": "microsoft excel",
+}
+
+_SPLIT = re.compile(r"[,;|\n•·]+")
+_AND = re.compile(r"\s+(?:and|&)\s+", re.IGNORECASE)
+# Lead-ins of free-text requirements ("strong knowledge of Python")
+_FILLER = re.compile(
+    r"^(?:(?:strong|solid|good|excellent|deep|basic|working|hands-on|proven|must have|required|with)\s+)*"
+    r"(?:(?:experience|knowledge|proficiency|expertise|familiarity|understanding|skills?)\s+(?:in|with|of)\s+)?",
+    re.IGNORECASE
+)
+_PREFERRED = re.compile(r"nice to have|preferred|bonus|good to have|plus:", re.IGNORECASE)
+_YEARS = re.compile(r"(\d+(?:\.\d+)?)\s*\+?\s*(?:-\s*\d+\s*)?(?:years?|yrs?)", re.IGNORECASE)
+
+def normalize_skill(name):
+    # Leading dots are kept (".net"); trailing punctuation is not
+    skill = re.sub(r"\s+", " ", name.strip().strip(":;-()[]\"'").rstrip(".").strip().lower())
+    return SKILL_ALIASES.get(skill, skill)
+
+_KNOWN_SKILLS = set(SKILL_ALIASES) | set(SKILL_ALIASES.values())
+
+# Skills picked out of free text (a job description without a requirements list, a long requirement
+# line) on top of the aliases above. Aliases that are also ordinary words ("go", "rest", "excel")
+# only count as skills in lists.
+PROSE_SKILLS = {
+    "java", "kotlin", "scala", "php", "ruby", "ruby on rails", "rails", "rust", "perl", "matlab", ".net", "asp.net",
+    "django", "flask", "laravel", "svelte", "redux", "tailwind", "bootstrap", "jquery", "graphql", "grpc",
+    "sql", "nosql", "sqlite", "oracle", "redis", "cassandra", "elasticsearch", "dynamodb", "snowflake",
+    "docker", "terraform", "ansible", "jenkins", "linux", "bash", "git", "gitlab", "nginx", "microservices",
+    "kafka", "rabbitmq", "spark", "hadoop", "airflow", "etl", "pandas", "numpy", "pytorch", "keras",
+    "tableau", "statistics", "figma", "selenium", "jira", "agile", "scrum", "android", "ios", "flutter", "react native",
+}
+_PROSE_AMBIGUOUS = {"go", "next", "node", "rest", "express", "cv", "ts", "tf", "py", "dl", "excel", "spring"}
+_PROSE_TERMS = (_KNOWN_SKILLS | PROSE_SKILLS) - _PROSE_AMBIGUOUS
+_PROSE_TERM_WORDS = max(len(term.split()) for term in _PROSE_TERMS)
+# Requirement lines with more words than this are read as a sentence, not as one skill name
+_MAX_SKILL_WORDS = 4
+_TOKEN = re.compile(r"\.?[a-z0-9][a-z0-9+#./-]*")
+
+# Every skill name ever seen gets a small integer ID, so skill sets become int arrays
+_vocabulary = {}
+_vocabulary_lock = threading.Lock()
+
+def _skill_id(skill):
+    skill_id = _vocabulary.get(skill)
+    if skill_id is None:
+        with _vocabulary_lock:
+            skill_id = _vocabulary.setdefault(skill, len(_vocabulary))
+    return skill_id
+
+def _scan(text):
+    """
+    Skills named in free text: the longest known term (up to a few words) at each position.
+    """
+    words = [word.rstrip("./-") for word in _TOKEN.findall(text.lower())]
+    found = []
+    position = 0
+    while position < len(words):
+        for length in range(min(_PROSE_TERM_WORDS, len(words) - position), 0, -1):
+            term = " ".join(words[position:position + length])
+            if term in _PROSE_TERMS:
+                found.append(normalize_skill(term))
+                position += length
+                break
+        else:
+            position += 1
+    return found
+
+def _parse(text, prose=False):
+    if prose:
+        return list(dict.fromkeys(_scan(text or "")))
+    skills = []
+    for part in _SPLIT.split(text or ""):
+        # Drop "5+ years of" style qualifiers; they feed experience fit, not the skill set
+        part = re.sub(r"^(?:of|in|with)\s+", "", _YEARS.sub("", part).strip(), flags=re.IGNORECASE)
+        part = _FILLER.sub("", part).strip()
+        if len(part.split()) > _MAX_SKILL_WORDS:
+            pieces = _scan(part) # "Experience building REST APIs with Django"
+        elif part.lower() in _KNOWN_SKILLS:
+            pieces = [part] # "data structures and algorithms" is one skill
+        else:
+            pieces = _AND.split(part) # "Python and Django" is two
+        for piece in pieces:
+            skill = normalize_skill(piece)
+            if skill and len(skill) <= 50 and skill not in skills:
+                skills.append(skill)
+    return skills
+
+@lru_cache(maxsize=8192)
+def candidate_skill_ids(skills_text):
+    """
+    Sorted unique skill IDs of a Candidate.skills string. Cached per distinct string.
+    """
+    ids = np.unique(np.array([_skill_id(skill) for skill in _parse(skills_text)], dtype=np.int64))
+    ids.setflags(write=False)
+    return ids
+
+@lru_cache(maxsize=1024)
+def job_profile(requirements_text, prose=False):
+    """
+    (skills, skill IDs, weights, required years) for a Job.requirements string, or with prose=True
+    for a free-text description. Cached per distinct string.
+    Skills after a "nice to have" / "preferred" marker get PREFERRED_SKILL_WEIGHT.
+    """
+    text = requirements_text or ""
+    marker = _PREFERRED.search(text)
+    required = _parse(text[:marker.start()] if marker else text, prose)
+    preferred = [skill for skill in _parse(text[marker.end():], prose) if skill not in required] if marker else []
+    skills = tuple(required + preferred)
+    ids = np.array([_skill_id(skill) for skill in skills], dtype=np.int64)
+    weights = np.array([1.0] * len(required) + [PREFERRED_SKILL_WEIGHT] * len(preferred))
+    years = [float(match) for match in _YEARS.findall(text)]
+    return skills, ids, weights, max(years) if years else 0.0
+
+def _requirements(job):
+    # Jobs created without a requirements list fall back to the skills named in their description
+    return (job.requirements, False) if job.requirements else (job.description, True)
+
+def score_candidates(job, candidates):
+    """
+    Scores every candidate against the job in one vectorised pass.
+    Returns (skill_overlap, experience_fit, overall) arrays: overlap and fit in 0..1, overall in 0..100.
+    """
+    n = len(candidates)
+    _, job_ids, weights, required_years = job_profile(*_requirements(job))
+
+    if len(job_ids) and n:
+        per_candidate = [candidate_skill_ids(candidate.skills or "") for candidate in candidates]
+        owners = np.repeat(np.arange(n), [len(ids) for ids in per_candidate])
+        flat = np.concatenate(per_candidate) if owners.size else np.zeros(0, dtype=np.int64)
+        # Weight of each candidate skill in this job (0 if the job doesn't ask for it)
+        order = np.argsort(job_ids)
+        position = np.searchsorted(job_ids[order], flat)
+        position = np.minimum(position, len(job_ids) - 1)
+        hit = job_ids[order][position] == flat
+        overlap = np.bincount(owners[hit], weights=weights[order][position[hit]], minlength=n) / weights.sum()
+    else:
+        overlap = np.zeros(n)
+
+    years = np.array([candidate.total_experience or 0.0 for candidate in candidates], dtype=np.float64)
+    fit = np.clip(years / required_years, 0.0, 1.0) if required_years > 0 else np.ones(n)
+
+    # Without any recognisable required skills, experience is all there is to go on
+    skill_weight = SKILL_SCORE_WEIGHT if len(job_ids) else 0.0
+    overall = 100.0 * (skill_weight * overlap + (1.0 - skill_weight) * fit)
+    return overlap, fit, overall
+
+def explain_many(job, candidates):
+    """
+    Breakdown of the deterministic score for each candidate: matched and missing skills,
+    experience fit. One vectorised scoring pass, with skills from the cached skill IDs.
+    """
+    skills, job_ids, weights, required_years = job_profile(*_requirements(job))
+    preferred = [skill for skill, weight in zip(skills, weights) if weight != 1.0]
+    overlap, fit, overall = score_candidates(job, candidates)
+    explanations = []
+    for row, candidate in enumerate(candidates):
+        has = np.isin(job_ids, candidate_skill_ids(candidate.skills or ""))
+        explanations.append({
+            "overall_match_score": round(float(overall[row]), 1),
+            "skill_match_percentage": round(float(overlap[row]) * 100, 1),
+            "experience_match_percentage": round(float(fit[row]) * 100, 1),
+            "matched_skills": [skill for skill, matched in zip(skills, has) if matched],
+            "missing_skills": [skill for skill, matched in zip(skills, has) if not matched],
+            "preferred_skills": preferred,
+            "required_years": required_years,
+            "candidate_years": candidate.total_experience or 0.0,
+        })
+    return explanations
+
+def explain(job, candidate):
+    """
+    Breakdown of the deterministic score for one pair; see explain_many.
+    """
+    return explain_many(job, [candidate])[0]
+
+def reasoning(explanation):
+    matched, missing = explanation["matched_skills"], explanation["missing_skills"]
+    text = f"Skill overlap: {len(matched)}/{len(matched) + len(missing)} job skills"
+    if missing:
+        text += f" (missing: {', '.join(missing[:8])})"
+    if explanation["required_years"]:
+        text += f"; experience {explanation['candidate_years']:g}/{explanation['required_years']:g} years"
+    return text + ". Deterministic score; request an explanation for LLM reasoning."
@@ -0,0 +1,81 @@
+"""
+Drives llm.match_batches_concurrently against fake_llm_server.py and checks that
+rate limits and errors never turn into made-up scores.
+
+Starts the fake server in-process, runs one bulk match, then reports throughput,
+what the server answered (200 / 429 / 5xx), the client's retry and breaker counters,
+and whether every returned score is a real answer.
+
+    python stress_llm_client.py --candidates 200 --server-rpm 120 --client-rpm 100
+    python stress_llm_client.py --outage           # breaker should open and calls fail fast
+    python stress_llm_client.py --outage --local   # ...and the router should fail over to the local model
+    python stress_llm_client.py --local --bulk     # bulk work pinned to the local model
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--client-rpm", type=int, default=0, help="LLM_RPM_LIMIT for the client (0 = unlimited)")
+    parser.add_argument("--server-rpm", type=int, default=0, help="fake server's own RPM limit (0 = unlimited)")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--spike-rate", type=float, default=0.05)
+    parser.add_argument("--spike-seconds", type=float, default=1.0)
+    parser.add_argument("--outage", action="store_true", help="hosted server answers every request with 503")
+    parser.add_argument("--local", action="store_true", help="also route to a second fake server acting as the local model")
+    parser.add_argument("--bulk", action="store_true", help="run as bulk work, pinned to the local model")
+    args = parser.parse_args()
+
+    import fake_llm_server
+    server, state = fake_llm_server.start(
+        rpm=args.server_rpm, rate_limit_rate=args.rate_limit_rate, error_rate=args.error_rate,
+        spike_rate=args.spike_rate, spike_seconds=args.spike_seconds, outage=args.outage
+    )
+    servers = [("groq", server, state)]
+    if args.local:
+        # Slower but never rate limited, like a local model
+        local_server, local_state = fake_llm_server.start(latency=0.2)
+        servers.append(("ollama", local_server, local_state))
+        os.environ["LLM_PROVIDERS"] = "groq,ollama"
+        os.environ["LOCAL_LLM_BASE_URL"] = f"http://127.0.0.1:{local_server.server_port}/v1"
+        os.environ["LLM_BULK_PROVIDER"] = "ollama" if args.bulk else ""
+
+    # llm.py reads its configuration at import time
+    os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{server.server_port}"
+    os.environ.setdefault("GROQ_API_KEY", "fake")
+    os.environ["LLM_CACHE_ENABLED"] = "0"
+    os.environ["LLM_RPM_LIMIT"] = str(args.client_rpm)
+    os.environ["LLM_TPM_LIMIT"] = "0"
+    os.environ.setdefault("LLM_BACKOFF_BASE", "0.2")
+    import llm
+
+    items = [(candidate_id, f"Resume of candidate {candidate_id}: Python, SQL, {candidate_id % 7} years") for candidate_id in range(args.candidates)]
+    started = time.perf_counter()
+    with llm.use_workload("bulk" if args.bulk else "interactive"):
+        results = asyncio.run(llm.match_batches_concurrently("Backend engineer, Python and SQL", items, args.batch_size, args.concurrency))
+    elapsed = time.perf_counter() - started
+    for _, s, _ in servers:
+        s.shutdown()
+
+    invalid = [candidate_id for candidate_id, match in results.items() if llm._valid_match(match) is None or match["reasoning"] != "Fake LLM score"]
+    print(f"{len(results)}/{args.candidates} candidates scored in {elapsed:.2f}s ({len(results) / elapsed:.1f}/s)")
+    for name, _, server_state in servers:
+        print(f"{name} server answered: {server_state.counts}")
+    print(f"Router: {llm.router.stats()}")
+    if invalid:
+        print(f"FAILED: {len(invalid)} results are not real LLM answers, e.g. {invalid[:5]}")
+        sys.exit(1)
+    if args.outage:
+        calls = sum(state.counts.values())
+        print(f"Outage: {calls} requests reached the hosted server for {args.candidates} candidates (breaker {llm.router.providers[0].limiter.breaker.state})")
+    print("OK: no fabricated scores")
+
+if __name__ == "__main__":
+    main()
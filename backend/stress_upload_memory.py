@@ -0,0 +1,115 @@
+"""
+Peak memory of concurrent resume uploads.
+
+Starts the app with uvicorn on a temporary SQLite database, sends --uploads concurrent
+uploads of --size-mb each to /api/upload-resume and reports how much the Python heap
+(tracemalloc) grew at its peak while they were received, per upload. Fails if that is
+over --max-per-upload-mb, e.g. because a handler went back to reading whole files into
+memory. Also checks that an upload declaring more than PDF_MAX_BYTES is refused with 413
+before its body is sent.
+
+The payload isn't a valid PDF, so the ingestion pipeline rejects it right after the
+upload; nothing reaches the LLM.
+
+    python stress_upload_memory.py --uploads 16 --size-mb 8
+"""
+import argparse
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=16, help="concurrent uploads")
+    parser.add_argument("--size-mb", type=float, default=8)
+    parser.add_argument("--max-per-upload-mb", type=float, default=2.0, help="fail above this peak heap growth per upload")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="upload-memory-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/upload.db"
+    os.environ["INGEST_DIR"] = os.path.join(workdir, "uploads")
+    os.environ["INGEST_QUEUE_SIZE"] = str(max(100, args.uploads * 2))
+    os.environ.setdefault("QUIZ_PREGENERATE", "0")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(workdir) # Index files and the LLM cache land in the temp directory
+    import httpx
+    import uvicorn
+    import auth
+    import main as app_module
+    import pdf_extract
+    from database import SessionLocal
+    from models import User
+
+    db = SessionLocal()
+    user = User(name="Upload Test", email="upload-test@example.com", role="recruiter", password_hash="x")
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    db.close()
+    app_module.app.dependency_overrides[auth.get_current_user] = lambda: user
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app_module.app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    url = f"http://127.0.0.1:{port}/api/upload-resume"
+
+    size = int(args.size_mb * 1024 * 1024)
+    if size > pdf_extract.PDF_MAX_BYTES:
+        sys.exit(f"--size-mb is over PDF_MAX_BYTES ({pdf_extract.PDF_MAX_BYTES} bytes)")
+    payload_path = os.path.join(workdir, "payload.pdf")
+    with open(payload_path, "wb") as f:
+        for _ in range(0, size, 1024 * 1024):
+            f.write(os.urandom(min(1024 * 1024, size - f.tell())))
+
+    def upload(_):
+        # httpx streams the open file in chunks, so the client side adds little to the heap
+        with open(payload_path, "rb") as f, httpx.Client(timeout=120) as client:
+            return client.post(url, files={"file": ("payload.pdf", f, "application/pdf")}).status_code
+
+    upload(None) # Warm up imports, the DB and the thread pool outside the measurement
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.uploads) as pool:
+        statuses = list(pool.map(upload, range(args.uploads)))
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    per_upload_mb = peak / args.uploads / (1024 * 1024)
+    print(f"{args.uploads} concurrent uploads of {args.size_mb:g} MB in {elapsed:.2f}s, statuses {sorted(set(statuses))}")
+    print(f"peak heap growth {peak / (1024 * 1024):.1f} MB total, {per_upload_mb:.2f} MB per upload")
+
+    # Declares a body over the limit and sends none of it: the answer must come back anyway
+    with socket.create_connection(("127.0.0.1", port), timeout=10) as s:
+        s.sendall((f"POST /api/upload-resume HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+                   f"Content-Type: multipart/form-data; boundary=x\r\nContent-Length: {pdf_extract.PDF_MAX_BYTES * 2}\r\n\r\n").encode())
+        status_line = s.recv(1024).split(b"\r\n", 1)[0].decode()
+    print(f"oversized upload: {status_line}")
+
+    server.should_exit = True
+    failures = []
+    if any(status != 202 for status in statuses):
+        failures.append("not every upload was accepted")
+    if per_upload_mb > args.max_per_upload_mb:
+        failures.append(f"peak memory per upload {per_upload_mb:.2f} MB is over {args.max_per_upload_mb:g} MB")
+    if " 413 " not in f"{status_line} ":
+        failures.append("oversized upload was not refused with 413 up front")
+    if failures:
+        sys.exit("FAILED: " + "; ".join(failures))
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Concurrency stress test for rag.VectorStore.
+
+Runs writer threads (upserts and deletes over disjoint ID ranges) alongside
+reader threads (searches and lookups), then checks that:
+  - every ID holds the vector its writer wrote last (within codec precision), or is absent if deleted
+  - the index size matches the number of live IDs
+  - searches only ever returned IDs that some writer had written
+  - a store reopened from the snapshot + log matches the live store
+
+Runs in a temporary directory, so the real index files are never touched.
+
+    python stress_vector_store.py --writers 8 --readers 8 --ops 2000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=1000, help="operations per writer")
+    parser.add_argument("--ids", type=int, default=200, help="IDs owned by each writer")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="vector-stress-")
+    os.chdir(workdir)
+    import rag # Imported here so its module-level stores live in the temp directory
+
+    store = rag.VectorStore("stress_index.bin", "stress_log.bin")
+    stop_compaction = store.start_compaction(interval=0.2, min_records=200) # Compact aggressively while under load
+    dimension = rag.dimension
+
+    expected = [dict() for _ in range(args.writers)] # Per writer: id -> last vector written, None if deleted
+    seen_ids = set()
+    errors = []
+    done = threading.Event()
+
+    def writer(w):
+        rng = random.Random(w)
+        base = w * args.ids
+        try:
+            for _ in range(args.ops):
+                candidate_id = base + rng.randrange(args.ids)
+                if rng.random() < 0.2:
+                    store.delete(candidate_id)
+                    expected[w][candidate_id] = None
+                else:
+                    vector = rag.normalize(np.random.default_rng(rng.randrange(1 << 30)).standard_normal(dimension))
+                    store.upsert_vectors([candidate_id], vector.reshape(1, -1))
+                    expected[w][candidate_id] = vector
+        except Exception as e:
+            errors.append(f"writer {w}: {e!r}")
+
+    def reader(r):
+        rng = np.random.default_rng(1000 + r)
+        while not done.is_set():
+            try:
+                for hit in store.search_vector(rng.standard_normal(dimension), k=10):
+                    seen_ids.add(hit["candidate_id"])
+                store.get_vector(int(rng.integers(args.writers * args.ids)))
+                len(store)
+            except Exception as e:
+                errors.append(f"reader {r}: {e!r}")
+                return
+
+    started = time.perf_counter()
+    writers = [threading.Thread(target=writer, args=(w,)) for w in range(args.writers)]
+    readers = [threading.Thread(target=reader, args=(r,)) for r in range(args.readers)]
+    for thread in writers + readers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    done.set()
+    for thread in readers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    def check(label, s):
+        live = 0
+        for per_writer in expected:
+            for candidate_id, vector in per_writer.items():
+                stored = s.get_vector(candidate_id)
+                if vector is None:
+                    if stored is not None:
+                        errors.append(f"{label}: id {candidate_id} should be deleted")
+                else:
+                    live += 1
+                    # Cosine rather than exact equality: lossy codecs only approximate the vector
+                    if stored is None or float(np.dot(stored, vector)) < 0.9:
+                        errors.append(f"{label}: id {candidate_id} holds the wrong vector")
+        if len(s) != live:
+            errors.append(f"{label}: index holds {len(s)} vectors, expected {live}")
+
+    check("live", store)
+
+    written = {candidate_id for per_writer in expected for candidate_id in per_writer}
+    if not seen_ids <= written:
+        errors.append(f"search returned ids nobody wrote: {sorted(seen_ids - written)[:10]}")
+
+    stop_compaction.set()
+    store.save()
+    # Leave one record in the log so reopening exercises snapshot + replay
+    vector = rag.normalize(np.ones(dimension))
+    store.upsert_vectors([0], vector.reshape(1, -1))
+    expected[0][0] = vector
+    store.close() # Releases the log for the reopened store
+    check("reopened", rag.VectorStore("stress_index.bin", "stress_log.bin"))
+
+    total_ops = args.writers * args.ops
+    print(f"{total_ops} writes with {args.readers} concurrent readers in {elapsed:.2f}s ({total_ops / elapsed:.0f} writes/s)")
+    print(f"Working directory: {workdir}")
+    if errors:
+        print(f"FAILED: {len(errors)} problems")
+        for error in errors[:20]:
+            print(f"  {error}")
+        sys.exit(1)
+    print("OK: index and id mapping consistent")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+import skill_scorer
+
+# Run with `python test_skill_scorer.py` (or pytest); needs only numpy.
+
+PROSE_DESCRIPTION = (
+    "We are hiring a backend engineer to build REST APIs in Python and Django on AWS. "
+    "You will work with PostgreSQL, Docker and Kubernetes, and go the extra mile for our users. "
+    "Please send your CV. Nice to have: React or GraphQL."
+)
+
+def _job(requirements, description=PROSE_DESCRIPTION):
+    return SimpleNamespace(requirements=requirements, description=description)
+
+def _candidate(skills, years=3.0):
+    return SimpleNamespace(skills=skills, total_experience=years)
+
+def test_prose_description_skills():
+    skills, _, weights, _ = skill_scorer.job_profile(*skill_scorer._requirements(_job(None)))
+    assert skills == (
+        "rest api", "python", "django", "amazon web services", "postgresql", "docker", "kubernetes",
+        "react", "graphql",
+    )
+    # Everyday words that are also aliases ("go", "CV") are not read as skills in prose
+    assert "go" not in skills and "computer vision" not in skills
+    assert list(weights[-2:]) == [skill_scorer.PREFERRED_SKILL_WEIGHT] * 2
+
+def test_prose_only_job_scores_skill_overlap():
+    overlap, _, _ = skill_scorer.score_candidates(_job(""), [
+        _candidate("Python, Django, AWS, Docker"),
+        _candidate("Photoshop, Illustrator"),
+    ])
+    assert overlap[0] > 0.4
+    assert overlap[1] == 0.0
+
+def test_long_requirement_line_is_scanned():
+    skills = skill_scorer._parse("5+ years of experience building REST APIs with Django, Kubernetes and Helm charts")
+    assert skills == ["rest api", "django", "kubernetes", "helm charts"]
+
+def test_requirements_list_unchanged():
+    skills, _, _, years = skill_scorer.job_profile("Python, data structures and algorithms, 3+ years")
+    assert skills == ("python", "data structures and algorithms")
+    assert years == 3.0
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: OK")
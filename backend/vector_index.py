@@ -0,0 +1,161 @@
+import math
+import os
+import faiss
+import numpy as np
+
+# Index tiers: "flat" is exact brute force; "ivf" and "hnsw" are approximate.
+# "auto" starts flat and promotes to VECTOR_ANN_TIER once the corpus reaches VECTOR_PROMOTE_AT.
+VECTOR_INDEX_TIER = os.getenv("VECTOR_INDEX_TIER", "auto")
+VECTOR_ANN_TIER = os.getenv("VECTOR_ANN_TIER", "hnsw")
+VECTOR_PROMOTE_AT = int(os.getenv("VECTOR_PROMOTE_AT", "50000"))
+VECTOR_IVF_NPROBE = int(os.getenv("VECTOR_IVF_NPROBE", "16"))
+VECTOR_HNSW_M = int(os.getenv("VECTOR_HNSW_M", "32"))
+
+# Vector codecs: how each stored vector is encoded.
+# flat = float32 (1536 B/vector), fp16 = half precision (768 B), sq8 = 8-bit scalar quantized (384 B),
+# pq = product quantized with VECTOR_PQ_M one-byte sub-codes (48 B by default)
+VECTOR_CODEC = os.getenv("VECTOR_CODEC", "flat")
+VECTOR_PQ_M = int(os.getenv("VECTOR_PQ_M", "48"))
+
+# Open the snapshot memory-mapped and read-only, so it is paged in from the OS cache instead of held in RAM
+VECTOR_INDEX_MMAP = os.getenv("VECTOR_INDEX_MMAP", "0") == "1"
+
+TIERS = ("flat", "ivf", "hnsw")
+CODECS = ("flat", "fp16", "sq8", "pq")
+
+# Below this size an ANN tier has too little data to train its coarse quantizer
+ANN_MIN_VECTORS = 1000
+
+# Vectors needed before a codec can be trained (PQ: 256 centroids per sub-quantizer)
+CODEC_MIN_VECTORS = {"flat": 0, "fp16": 0, "sq8": 1000, "pq": 10000}
+
+def nlist_for(n):
+    # Usual FAISS rule of thumb: ~4 * sqrt(n) inverted lists
+    return int(min(65536, max(16, 4 * math.sqrt(max(n, 1)))))
+
+def codec_string(codec):
+    if codec == "flat":
+        return "Flat"
+    if codec == "fp16":
+        return "SQfp16"
+    if codec == "sq8":
+        return "SQ8"
+    if codec == "pq":
+        return f"PQ{VECTOR_PQ_M}"
+    raise ValueError(f"Unknown vector codec: {codec}")
+
+def factory_string(tier, n, codec="flat"):
+    """
+    FAISS index_factory description for a tier sized for `n` vectors.
+    The "hnsw" tier uses HNSW as the IVF coarse quantizer: a bare IndexHNSWFlat
+    cannot remove vectors, which the store needs for upserts and deletes.
+    """
+    if tier == "flat":
+        return f"IDMap2,{codec_string(codec)}"
+    if tier == "ivf":
+        return f"IVF{nlist_for(n)},{codec_string(codec)}"
+    if tier == "hnsw":
+        return f"IVF{nlist_for(n)}_HNSW{VECTOR_HNSW_M},{codec_string(codec)}"
+    raise ValueError(f"Unknown vector index tier: {tier}")
+
+def build_index(tier, dimension, ids=None, vectors=None, codec="flat"):
+    """
+    Creates an index of the given tier and codec with inner-product metric,
+    trains it on `vectors` if needed, and adds them under `ids`.
+    """
+    n = 0 if ids is None else len(ids)
+    index = faiss.index_factory(dimension, factory_string(tier, n, codec), faiss.METRIC_INNER_PRODUCT)
+    ivf = faiss.try_extract_index_ivf(index)
+
+    if not index.is_trained:
+        needed = max(ivf.nlist if ivf is not None else 1, CODEC_MIN_VECTORS[codec])
+        if n < needed:
+            raise ValueError(f"Need at least {needed} vectors to train a {tier}/{codec} index, got {n}")
+        # Train on a bounded sample; k-means quality saturates well before using everything
+        sample_size = min(n, max(ivf.nlist * 64 if ivf is not None else 0, 256 * 64))
+        sample = vectors
+        if sample_size < n:
+            sample = vectors[np.random.default_rng(0).choice(n, sample_size, replace=False)]
+        index.train(np.ascontiguousarray(sample, dtype=np.float32))
+
+    if ivf is not None:
+        # Hashtable direct map: lets us reconstruct and remove by candidate ID
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        ivf.nprobe = VECTOR_IVF_NPROBE
+
+    if n:
+        index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), np.asarray(ids, dtype=np.int64))
+    return index
+
+def read_index(path, mmap=VECTOR_INDEX_MMAP):
+    """
+    Loads a snapshot. With mmap the vector codes stay in the page cache,
+    shared by every process mapping the same file, and the index is read-only:
+    FAISS aborts the process on any attempt to modify it.
+    """
+    if mmap:
+        return configure(faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY))
+    return configure(faiss.read_index(path))
+
+def tier_of(index):
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is None:
+        return "flat"
+    if isinstance(faiss.downcast_index(ivf.quantizer), faiss.IndexHNSW):
+        return "hnsw"
+    return "ivf"
+
+def codec_of(index):
+    ivf = faiss.try_extract_index_ivf(index)
+    storage = faiss.downcast_index(ivf if ivf is not None else index.index)
+    if isinstance(storage, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    if isinstance(storage, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "fp16" if storage.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "flat"
+
+def configure(index):
+    # Search-time parameters aren't always restored from disk; apply the configured ones
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = VECTOR_IVF_NPROBE
+    return index
+
+def export_vectors(index):
+    """
+    Returns (ids, vectors) for everything stored in an index of any tier.
+    Vectors come back decoded, so they are approximate for lossy codecs.
+    """
+    if index.ntotal == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, index.d), dtype=np.float32)
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is None:
+        ids = faiss.vector_to_array(index.id_map).astype(np.int64)
+        return ids, index.index.reconstruct_n(0, index.ntotal)
+
+    invlists = ivf.invlists
+    ids = np.concatenate([
+        faiss.rev_swig_ptr(invlists.get_ids(list_no), invlists.list_size(list_no)).copy()
+        for list_no in range(ivf.nlist) if invlists.list_size(list_no)
+    ]).astype(np.int64)
+    return ids, index.reconstruct_batch(ids)
+
+def target_tier(ntotal):
+    """
+    Tier the store should be using for a corpus of `ntotal` vectors.
+    """
+    if ntotal < ANN_MIN_VECTORS:
+        return "flat"
+    if VECTOR_INDEX_TIER != "auto":
+        return VECTOR_INDEX_TIER
+    return VECTOR_ANN_TIER if ntotal >= VECTOR_PROMOTE_AT else "flat"
+
+def target_codec(ntotal):
+    """
+    Codec the store should be using: the configured one once there is enough
+    data to train it, otherwise uncompressed float32.
+    """
+    if ntotal >= CODEC_MIN_VECTORS[VECTOR_CODEC]:
+        return VECTOR_CODEC
+    return "flat"
@@ -0,0 +1,283 @@
+import os
+import queue
+import struct
+import threading
+import zlib
+import numpy as np
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+OP_UPSERT = 1
+OP_DELETE = 2
+
+# Record layout: header (op, candidate id, payload length) + payload + crc32 of header and payload
+_HEADER = struct.Struct("<BqI")
+_CRC = struct.Struct("<I")
+
+class VectorLogLocked(RuntimeError):
+    """Another process has the log open; a vector store has a single writer process."""
+
+class _Done(threading.Event):
+    # Set by the flusher when it reaches a flush/rotate/close marker. wait() re-raises
+    # any write failure since the previous marker, so a caller is never told that
+    # records are on disk when they are not.
+    error = None
+
+    def wait(self, timeout=None):
+        finished = super().wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return finished
+
+def _lock_exclusive(f):
+    # Non-blocking; raises OSError if another process holds the lock. Released when the process exits.
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+
+class VectorLog:
+    """
+    Append-only log of VectorStore mutations. Each upsert/delete is one small
+    record, so persisting a change costs the same no matter how large the
+    FAISS index is. Replaying the log on top of the last snapshot restores the index.
+
+    Appends only enqueue the records; a background flusher writes and fsyncs
+    whatever has accumulated in one go (group commit), keeping disk I/O off
+    the request path. Use flush() when a caller must wait for durability, and
+    close() before the process exits: the flusher is a daemon thread, so records
+    still queued at exit are otherwise lost.
+
+    Only one process may use a log (and the snapshot it belongs to): rotation renames
+    and removes the file, and each process only has its own mutations in memory.
+    Constructing a VectorLog takes an exclusive lock on `path`.lock for the life of the
+    process and raises VectorLogLocked if another process holds it.
+    """
+    def __init__(self, path, dimension):
+        self.path = path
+        self.dimension = dimension
+        self.records = 0 # Records appended since the last rotation, flushed or not
+        self._file = None
+        self._queue = queue.Queue()
+        self._flusher = None
+        self._failure = None # First write failure not yet reported to a waiter
+        self.closed = False
+        self._lock_file = self._lock()
+
+    def _lock(self):
+        lock_file = open(self.path + ".lock", "a+")
+        try:
+            _lock_exclusive(lock_file)
+        except OSError:
+            try:
+                lock_file.seek(0)
+                holder = lock_file.read().strip() or "unknown"
+            except OSError: # Windows locks the region against reads too
+                holder = "unknown"
+            lock_file.close()
+            raise VectorLogLocked(
+                f"{self.path} is in use by another process (pid {holder}). The vector store has one writer: "
+                "run a single server process, and stop it before running tools that write vectors."
+            )
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        return lock_file
+
+    def open(self):
+        """
+        Counts the valid records, cuts off a torn tail left by a crash,
+        opens the log for appending and starts the flusher.
+        """
+        self.records = sum(1 for _ in self.replay())
+        self._file = open(self.path, "ab")
+        self._flusher = threading.Thread(target=self._run, name=f"vector-log-flusher:{self.path}", daemon=True)
+        self._flusher.start()
+
+    def append_upserts(self, candidate_ids, vectors):
+        payload_size = self.dimension * 4
+        chunks = []
+        for candidate_id, vector in zip(candidate_ids, vectors):
+            payload = np.asarray(vector, dtype=np.float32).tobytes()
+            assert len(payload) == payload_size
+            chunks.append(self._encode(OP_UPSERT, candidate_id, payload))
+        self._write(chunks)
+
+    def append_deletes(self, candidate_ids):
+        self._write([self._encode(OP_DELETE, candidate_id, b"") for candidate_id in candidate_ids])
+
+    def replay(self):
+        """
+        Yields (op, candidate_id, vector_or_None) for every intact record.
+        """
+        for path in (self.rotated_path, self.path):
+            if os.path.exists(path):
+                yield from self._read(path)
+
+    @property
+    def rotated_path(self):
+        return self.path + ".old"
+
+    def flush(self):
+        """
+        Blocks until everything appended so far is on disk. Raises the error
+        if any of it could not be written.
+        """
+        self._marker("flush").wait()
+
+    def rotate(self):
+        """
+        Queues a rotation: records appended before this call stay in the old
+        log, everything after goes to a fresh one. Returns an Event that is set
+        once the rotation happened. Call under the store's write lock.
+        """
+        done = self._marker("rotate")
+        self.records = 0
+        return done
+
+    def _marker(self, kind):
+        if self.closed:
+            raise ValueError(f"Vector log {self.path} is closed")
+        done = _Done()
+        self._queue.put((kind, done))
+        return done
+
+    def _rotate_now(self):
+        self._file.close()
+        try:
+            if os.path.exists(self.rotated_path):
+                # A previous snapshot never made it to disk: keep its records too
+                with open(self.rotated_path, "ab") as rotated, open(self.path, "rb") as current:
+                    rotated.write(current.read())
+                    rotated.flush()
+                    os.fsync(rotated.fileno())
+                os.remove(self.path)
+            else:
+                os.replace(self.path, self.rotated_path)
+        finally:
+            # Appends carry on in whichever file is now at self.path
+            self._file = open(self.path, "ab")
+
+    def discard_rotated(self):
+        # Only safe once the snapshot covering the rotated records is on disk
+        if os.path.exists(self.rotated_path):
+            os.remove(self.rotated_path)
+
+    def close(self):
+        """
+        Writes out everything appended so far, closes the file, stops the
+        flusher and releases the lock. Later appends, flushes and rotations
+        raise ValueError.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self._flusher is not None:
+                done = _Done()
+                self._queue.put(("close", done))
+                self._flusher.join()
+                done.wait()
+        finally:
+            self._lock_file.close()
+
+    def _encode(self, op, candidate_id, payload):
+        header = _HEADER.pack(op, int(candidate_id), len(payload))
+        return header + payload + _CRC.pack(zlib.crc32(header + payload))
+
+    def _write(self, chunks):
+        if not chunks:
+            return
+        if self.closed:
+            raise ValueError(f"Vector log {self.path} is closed")
+        self._queue.put(("write", chunks))
+        self.records += len(chunks)
+
+    def _run(self):
+        while True:
+            # Take everything that is queued right now and commit it with one fsync
+            items = [self._queue.get()]
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            pending = []
+            for kind, payload in items:
+                if kind == "write":
+                    pending.extend(payload)
+                    continue
+                # Markers apply in order: everything queued before them is written first
+                self._attempt(self._commit, pending)
+                pending = []
+                if kind == "rotate":
+                    self._attempt(self._rotate_now)
+                elif kind == "close":
+                    self._attempt(self._file.close)
+                payload.error, self._failure = self._failure, None
+                payload.set()
+                if kind == "close":
+                    return
+            self._attempt(self._commit, pending)
+
+    def _attempt(self, step, *args):
+        # Any failure is kept for the next waiter; the flusher itself must keep running
+        try:
+            step(*args)
+        except Exception as e:
+            print(f"Error writing vector log {self.path}: {e}")
+            if self._failure is None:
+                self._failure = e
+
+    def _commit(self, chunks):
+        if not chunks:
+            return
+        if self._file.closed: # A failed rotation could not reopen it
+            self._file = open(self.path, "ab")
+        start = self._file.tell()
+        try:
+            self._file.write(b"".join(chunks))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except Exception:
+            # Cut off the part of the batch that did get written, so records
+            # appended later don't end up behind a torn one and get discarded
+            try:
+                self._file.close()
+            except Exception:
+                pass
+            self._file = open(self.path, "ab")
+            self._file.truncate(start)
+            raise
+
+    def _read(self, path):
+        good_offset = 0
+        with open(path, "rb") as f:
+            data = f.read()
+
+        while good_offset + _HEADER.size <= len(data):
+            op, candidate_id, length = _HEADER.unpack_from(data, good_offset)
+            end = good_offset + _HEADER.size + length
+            if end + _CRC.size > len(data):
+                break
+            (crc,) = _CRC.unpack_from(data, end)
+            if crc != zlib.crc32(data[good_offset:end]):
+                break
+
+            vector = None
+            if op == OP_UPSERT:
+                vector = np.frombuffer(data, dtype=np.float32, count=length // 4, offset=good_offset + _HEADER.size)
+            yield op, candidate_id, vector
+            good_offset = end + _CRC.size
+
+        if good_offset < len(data):
+            # Torn or corrupt tail from an interrupted write: drop it
+            print(f"Vector log {path}: discarding {len(data) - good_offset} trailing bytes")
+            with open(path, "r+b") as f:
+                f.truncate(good_offset)
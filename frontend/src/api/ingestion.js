@@ -0,0 +1,17 @@
+import api from './axios';
+
+// Resume uploads are processed in the background: poll until the server is done with one
+export const waitForIngestion = async (ingestionId, { interval = 1000, timeout = 180000 } = {}) => {
+    const deadline = Date.now() + timeout;
+    while (Date.now() < deadline) {
+        const { data } = await api.get(`/ingestion/${ingestionId}`);
+        if (data.status === 'done') {
+            return data;
+        }
+        if (data.status === 'failed') {
+            throw new Error(data.error || 'Processing failed');
+        }
+        await new Promise((resolve) => setTimeout(resolve, interval));
+    }
+    throw new Error('Processing is taking longer than expected. Please check back later.');
+};
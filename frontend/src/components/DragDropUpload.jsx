@@ -1,5 +1,6 @@
 import React, { useState, useRef } from 'react';
 import api from '../api/axios';
+import { waitForIngestion } from '../api/ingestion';
 import '../styles/dashboard.css';
 
 const DragDropUpload = ({ onUploadSuccess, onFileSelect, hideUploadButton = false }) => {
@@ -48,11 +49,12 @@ const DragDropUpload = ({ onUploadSuccess, onFileSelect, hideUploadButton = fals
             const response = await api.post('/upload-resume', formData, {
                 headers: { 'Content-Type': 'multipart/form-data' }
             });
-            if (onUploadSuccess) onUploadSuccess(response.data);
+            const ingestion = await waitForIngestion(response.data.id);
+            if (onUploadSuccess) onUploadSuccess(ingestion);
             setFile(null); // Reset after success
         } catch (err) {
             console.error("Upload failed", err);
-            setError('Failed to upload. Please try again.');
+            setError(err.response?.data?.detail || err.message || 'Failed to upload. Please try again.');
         } finally {
             setUploading(false);
         }
@@ -1,6 +1,7 @@
 import React, { useEffect, useState } from 'react';
 import { Link } from 'react-router-dom';
 import api from '../api/axios';
+import { waitForIngestion } from '../api/ingestion';
 import DragDropUpload from '../components/DragDropUpload';
 import '../styles/dashboard.css';
 
@@ -58,9 +59,10 @@ const CandidateDashboard = () => {
         formData.append('file', resumeFile);
 
         try {
-            await api.post(`/apply/${selectedJobId}`, formData, {
+            const response = await api.post(`/apply/${selectedJobId}`, formData, {
                 headers: { 'Content-Type': 'multipart/form-data' }
             });
+            await waitForIngestion(response.data.id);
             alert('Application submitted successfully!');
             // Update local state to show Applied
             setJobs(jobs.map(job =>
@@ -69,7 +71,7 @@ const CandidateDashboard = () => {
             closeApplyModal();
         } catch (error) {
             console.error("Application failed", error);
-            alert(error.response?.data?.detail || "Failed to apply");
+            alert(error.response?.data?.detail || error.message || "Failed to apply");
         } finally {
             setIsSubmitting(false);
         }
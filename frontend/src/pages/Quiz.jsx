@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useParams, useSearchParams, useNavigate } from 'react-router-dom';
 import api from '../api/axios';
 import { useAuth } from '../context/AuthContext';
@@ -18,6 +18,8 @@ const Quiz = () => {
     const [score, setScore] = useState(null);
     const [finalScore, setFinalScore] = useState(null);
     const [loading, setLoading] = useState(false);
+    const [streaming, setStreaming] = useState(false);
+    const eventSourceRef = useRef(null);
 
     useEffect(() => {
         if (paramJobId && paramCandidateId) {
@@ -27,12 +29,46 @@ const Quiz = () => {
         }
     }, [paramJobId, paramCandidateId]);
 
-    const startQuiz = async (id = jobId) => {
+    // Close the quiz stream when leaving the page
+    useEffect(() => () => eventSourceRef.current?.close(), []);
+
+    const startQuiz = (id = jobId) => {
         if (!user) {
             alert("You must be logged in to take the quiz.");
             navigate('/login');
             return;
         }
+        if (typeof EventSource === 'undefined') {
+            loadQuiz(id);
+            return;
+        }
+        // Questions arrive one by one over Server-Sent Events while the quiz is generated
+        setLoading(true);
+        setQuestions([]);
+        const source = new EventSource(`${api.defaults.baseURL}/quiz/${id}/stream`);
+        eventSourceRef.current = source;
+
+        source.addEventListener('question', (event) => {
+            const question = JSON.parse(event.data);
+            setQuestions((previous) => [...previous, question]);
+            setQuizStarted(true);
+            setStreaming(true);
+            setLoading(false);
+        });
+        source.addEventListener('done', () => {
+            source.close();
+            setStreaming(false);
+            setLoading(false);
+        });
+        source.onerror = () => {
+            source.close();
+            setStreaming(false);
+            // Stream broke before the quiz was stored: load it the regular way instead
+            loadQuiz(id);
+        };
+    };
+
+    const loadQuiz = async (id) => {
         setLoading(true);
         try {
             const response = await api.get(`/quiz/${id}`);
@@ -174,9 +210,10 @@ const Quiz = () => {
                             </div>
                         </div>
                     ))}
+                    {streaming && <p className="mb-4">Generating more questions...</p>}
                     <button
                         onClick={submitQuiz}
-                        disabled={loading}
+                        disabled={loading || streaming}
                         className="btn btn-applied"
                     >
                         {loading ? 'Submitting...' : 'Submit Answers'}